@@ -0,0 +1,136 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+
+from agno.agent import Agent
+from agno.memory.agent import AgentMemory
+from agno.models.google import Gemini
+from google.genai import Client as GeminiClient
+
+logger = logging.getLogger(__name__)
+
+# Agents per pool in each worker; a request holds one for the length of its run
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "8"))
+
+
+@lru_cache(maxsize=None)
+def shared_gemini_client(api_key: Optional[str]) -> Optional[GeminiClient]:
+    """One Gemini HTTP client per API key, shared by every pooled agent's model.
+
+    Each agent still gets its own Gemini model object, because agno keeps
+    per-run tool state on the model. Returns None when no client can be
+    created yet (e.g. missing key); models then create their own on first use.
+    """
+    try:
+        return Gemini(api_key=api_key).get_client()
+    except Exception as e:
+        logger.warning(f"Could not create shared Gemini client: {str(e)}")
+        return None
+
+
+class AgentPool:
+    """Fixed-size pool of reusable Agno agents.
+
+    Agno agents hold per-run state (messages, run response, tool calls), so
+    two requests must never run the same agent at once. Requests check an
+    agent out for the length of a run and hand it back. Agents are built on
+    first demand up to `size`, after which callers wait in FIFO order.
+    Memory is cleared on return so a long-lived agent does not accumulate
+    every past run.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Agent], size: int = AGENT_POOL_SIZE):
+        self.name = name
+        self.factory = factory
+        self.size = size
+        self._idle: Deque[Agent] = deque()
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._created = 0
+        self.checkouts = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _build(self) -> Agent:
+        self._created += 1
+        try:
+            agent = self.factory()
+        except Exception:
+            self._created -= 1
+            raise
+        logger.info(f"Built {self.name} agent {self._created}/{self.size}")
+        return agent
+
+    def warm(self, count: int = 1) -> None:
+        """Build agents ahead of time to avoid a cold start on the first requests"""
+        while self._created < min(count, self.size):
+            self._idle.append(self._build())
+
+    async def _acquire(self) -> Agent:
+        if self._idle:
+            return self._idle.pop()
+        if self._created < self.size:
+            return self._build()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start_time = time.monotonic()
+        try:
+            agent = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed an agent just as the caller went away
+                self._release(waiter.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        waited = time.monotonic() - start_time
+        self.waited += 1
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        return agent
+
+    def _release(self, agent: Agent) -> None:
+        if isinstance(agent.memory, AgentMemory):
+            agent.memory.clear()
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(agent)
+                return
+        self._idle.append(agent)
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[Agent]:
+        """Hold an agent for the duration of the block"""
+        agent = await self._acquire()
+        self.checkouts += 1
+        try:
+            yield agent
+        finally:
+            self._release(agent)
+
+    def clear(self) -> None:
+        """Drop idle agents so the next requests build fresh ones (agents in use are kept)"""
+        dropped = len(self._idle)
+        self._idle.clear()
+        self._created -= dropped
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": len(self._idle),
+            "in_use": self._created - len(self._idle),
+            "waiting": len(self._waiters),
+            "checkouts": self.checkouts,
+            "waited": self.waited,
+            "avg_wait": round(self.wait_time / self.checkouts, 4) if self.checkouts else 0.0,
+            "max_wait": round(self.max_wait_time, 4),
+        }
@@ -0,0 +1,136 @@
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import math
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i if in is it my of on or "
+    "please the this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, so "221G" -> "221g" and "I-20" -> "i", "20" """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists: score(d) = sum(1 / (k + rank))"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """In-memory Okapi BM25 index with incremental add/remove.
+
+    Documents are tokenized once when added. Each term keeps two parallel
+    compact arrays: document slots (uint32) and term frequencies (uint16).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._slots: Dict[str, int] = {}
+        self._slot_ids: List[Optional[str]] = []
+        self._lengths = array("I")
+        self._terms: Dict[int, List[str]] = {}
+        self._free_slots: List[int] = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slots
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version with the same ID"""
+        with self._lock:
+            if doc_id in self._slots:
+                self.remove(doc_id)
+            counts = Counter(tokenize(text))
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_ids[slot] = doc_id
+                self._lengths[slot] = sum(counts.values())
+            else:
+                slot = len(self._slot_ids)
+                self._slot_ids.append(doc_id)
+                self._lengths.append(sum(counts.values()))
+
+            self._slots[doc_id] = slot
+            self._terms[slot] = list(counts)
+            self._total_length += self._lengths[slot]
+            for term, frequency in counts.items():
+                slots, frequencies = self._postings.setdefault(term, (array("I"), array("H")))
+                slots.append(slot)
+                frequencies.append(min(frequency, 65535))
+
+    def remove(self, doc_id: str) -> bool:
+        """Drop a document; only the postings of its own terms are touched"""
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None:
+                return False
+            for term in self._terms.pop(slot, []):
+                slots, frequencies = self._postings[term]
+                position = slots.index(slot)
+                del slots[position]
+                del frequencies[position]
+                if not slots:
+                    del self._postings[term]
+            self._total_length -= self._lengths[slot]
+            self._lengths[slot] = 0
+            self._slot_ids[slot] = None
+            self._free_slots.append(slot)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.__init__(k1=self.k1, b=self.b)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        predicate: Optional[Callable[[str], bool]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return the top (doc_id, score) pairs for a query"""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._slots)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count or 1.0
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                slots, frequencies = posting
+                idf = math.log(1 + (count - len(slots) + 0.5) / (len(slots) + 0.5))
+                for slot, frequency in zip(slots, frequencies):
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[slot] / average_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            for slot, score in ranked:
+                doc_id = self._slot_ids[slot]
+                if predicate is not None and not predicate(doc_id):
+                    continue
+                results.append((doc_id, score))
+                if len(results) >= limit:
+                    break
+            return results
@@ -0,0 +1,155 @@
+from hashlib import md5
+from typing import List, Optional, Sequence
+import re
+
+from agno.document.base import Document
+
+# Chunk size limits (in characters)
+MAX_CHUNK_CHARS = 1500
+CHUNK_OVERLAP_CHARS = 200
+
+HEADER_PATTERN = re.compile(r'^(#{1,3})\s*(\S.*?)\s*#*\s*$')
+SEPARATOR_PATTERN = re.compile(r'^\s*-{3,}\s*$')
+
+
+def content_hash(content: str) -> str:
+    """Hash chunk content the same way PgVector fills its content_hash column"""
+    cleaned = content.replace("\x00", "\ufffd")
+    return md5(cleaned.encode()).hexdigest()
+
+
+def section_id_for(path: Sequence[str]) -> str:
+    """Build a stable section ID from a section's heading path, outermost heading first.
+
+    The parents are part of the ID so that sections sharing a title (e.g. a
+    "Template" under several headings) stay distinct. Slugs never contain
+    "--", so joining on it cannot make two paths collide.
+    """
+    slugs = [re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-') for title in path]
+    return "--".join(slug for slug in slugs if slug) or "untitled"
+
+
+def _split_sections(content: str) -> List[dict]:
+    """Split markdown-ish content on headers and --- separators"""
+    sections = []
+    headers = {1: None, 2: None, 3: None}
+    lines: List[str] = []
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if not body:
+            return
+        path = [headers[level] for level in (1, 2, 3) if headers[level]]
+        sections.append({
+            "id": section_id_for(path or ["General"]),
+            "title": path[-1] if path else "General",
+            "parent": path[-2] if len(path) > 1 else None,
+            "path": path,
+            "body": body,
+        })
+
+    for line in content.split("\n"):
+        # Never split inside a fenced template block
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+            lines.append(line)
+            continue
+        if in_fence:
+            lines.append(line)
+            continue
+
+        header = HEADER_PATTERN.match(line)
+        if header:
+            flush()
+            level = len(header.group(1))
+            headers[level] = header.group(2).strip()
+            # A new header resets all deeper levels
+            for deeper in range(level + 1, 4):
+                headers[deeper] = None
+            continue
+
+        if SEPARATOR_PATTERN.match(line):
+            flush()
+            continue
+
+        lines.append(line)
+
+    flush()
+    return sections
+
+
+def _split_body(body: str, max_chars: int, overlap: int) -> List[str]:
+    """Pack paragraphs into pieces of at most max_chars, overlapping by up to overlap chars"""
+    if len(body) <= max_chars:
+        return [body]
+
+    # Break oversized paragraphs on lines, then hard-wrap whatever is still too long
+    units: List[str] = []
+    for paragraph in re.split(r'\n\s*\n', body):
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for line in paragraph.split("\n"):
+            while len(line) > max_chars:
+                units.append(line[:max_chars])
+                line = line[max_chars:]
+            units.append(line)
+
+    pieces: List[str] = []
+    current = ""
+    for unit in units:
+        candidate = f"{current}\n\n{unit}" if current else unit
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        pieces.append(current)
+        # Carry the tail of the previous piece over, cut at a word boundary
+        tail = current[-overlap:] if overlap else ""
+        if tail and " " in tail and len(tail) < len(current):
+            tail = tail.split(" ", 1)[1]
+        current = f"{tail}\n\n{unit}" if tail and len(tail) + len(unit) + 2 <= max_chars else unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_content(
+    content: str,
+    source: str = "text_documents",
+    max_chars: int = MAX_CHUNK_CHARS,
+    overlap: int = CHUNK_OVERLAP_CHARS,
+    section_id: Optional[str] = None,
+) -> List[Document]:
+    """Split knowledge content into section-aware Documents with content-hash IDs"""
+    documents: List[Document] = []
+    seen = set()
+
+    for section in _split_sections(content):
+        heading = " > ".join(section["path"]) if section["path"] else section["title"]
+        # The heading is repeated in every chunk, so it counts against the size cap
+        body_cap = max(max_chars - len(heading) - 2, overlap + 1)
+        pieces = _split_body(section["body"], body_cap, overlap)
+        for index, piece in enumerate(pieces):
+            chunk_text = f"{heading}\n\n{piece}"
+            chunk_id = content_hash(chunk_text)
+            # Identical blocks (e.g. repeated templates) only need to be stored once
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            documents.append(Document(
+                id=chunk_id,
+                name=section["title"],
+                content=chunk_text,
+                meta_data={
+                    "source": source,
+                    "section_id": section_id or section["id"],
+                    "section": section["title"],
+                    "parent_section": section["parent"],
+                    "chunk_index": index,
+                    "chunk_count": len(pieces),
+                },
+            ))
+
+    return documents
@@ -0,0 +1,155 @@
+from array import array
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+import sqlite3
+import threading
+
+from agno.embedder.base import Embedder
+from agno.embedder.google import GeminiEmbedder
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache location (shared by all workers on the box)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "app/knowledge_data/embedding_cache.sqlite3")
+
+# Gemini accepts at most 100 texts per embed_content request
+EMBEDDING_BATCH_SIZE = 100
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only edits hit the same cache entry"""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    """Hash normalized text for use as a cache key"""
+    return sha256(normalize_text(text).encode()).hexdigest()
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    """Embedder wrapper that persists vectors as float32 blobs in SQLite"""
+
+    embedder: Optional[Embedder] = None
+    cache_path: str = EMBEDDING_CACHE_PATH
+    batch_size: int = EMBEDDING_BATCH_SIZE
+    hits: int = 0
+    misses: int = 0
+    _conn: Optional[sqlite3.Connection] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        if self.embedder is None:
+            raise ValueError("CachedEmbedder needs an embedder to wrap")
+        # PgVector sizes its vector column from the embedder's dimensions
+        self.dimensions = self.embedder.dimensions
+
+    @property
+    def model_key(self) -> str:
+        """Identify the wrapped model; task type changes the vectors Gemini returns"""
+        model_id = getattr(self.embedder, "id", type(self.embedder).__name__)
+        task_type = getattr(self.embedder, "task_type", None)
+        return f"{model_id}:{task_type}" if task_type else model_id
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, check_same_thread=False, timeout=30)
+            # WAL lets several worker processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, dimensions, text_hash))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _lookup(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """Fetch cached vectors for the given text hashes"""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    (self.model_key, self.dimensions or 0, *batch),
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        """Persist freshly computed vectors"""
+        rows = [
+            (self.model_key, self.dimensions or 0, key, array("f", vector).tobytes())
+            for key, vector in items.items()
+            if vector
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, in one request when the wrapped embedder supports it"""
+        if isinstance(self.embedder, GeminiEmbedder):
+            response = self.embedder._response(text=texts)
+            return [embedding.values for embedding in response.embeddings]
+        return [self.embedder.get_embedding(text) for text in texts]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Return embeddings for texts, embedding cache misses in batches"""
+        hashes = [text_hash(text) for text in texts]
+        found = self._lookup(hashes)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        keys = list(missing.keys())
+        for i in range(0, len(keys), self.batch_size):
+            batch_keys = keys[i:i + self.batch_size]
+            vectors = self._embed_batch([missing[key] for key in batch_keys])
+            computed = dict(zip(batch_keys, vectors))
+            self._store(computed)
+            found.update(computed)
+
+        if missing:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} embedded")
+        return [found.get(key, []) for key in hashes]
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = text_hash(text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key], None
+
+        self.misses += 1
+        embedding, usage = self.embedder.get_embedding_and_usage(text)
+        self._store({key: embedding})
+        return embedding, usage
@@ -3,11 +3,16 @@ from agno.knowledge.text import TextKnowledgeBase
 from agno.vectordb.pgvector import PgVector, SearchType
 from agno.document.base import Document
 # from agno_manager.knowledge_data.text_documents import content_data
-from uuid import uuid4
 from agno.knowledge.document import DocumentKnowledgeBase
 from agno.embedder.google import GeminiEmbedder
 from . import text_documents
+from .chunking import chunk_content
+from .embedding_cache import CachedEmbedder
+from .local_vector_db import LocalVectorDb
+from .knowledge_store import KnowledgeStore
 from agno.reranker.cohere import CohereReranker
+from app.prompt_budget import fit_retrieved
+from typing import Any, Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -32,20 +37,75 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 #     ),
 # )
 
-documents = [Document(id=str(uuid4()), content=content_data)]
+# UI-managed sections live in a transactional store; the static corpus is never rewritten
+knowledge_store = KnowledgeStore()
+
+def load_documents():
+    """Chunk the static corpus plus every stored section into section-sized documents"""
+    documents = []
+    # Once the static corpus has been imported into the store, the store owns it
+    if not knowledge_store.owns_static_content:
+        documents.extend(chunk_content(content_data))
+    for section in knowledge_store.list_sections():
+        documents.extend(chunk_content(
+            f"### {section['title']}\n{section['content']}",
+            source="knowledge_store",
+            section_id=section["id"],
+        ))
+    return documents
+
+# Split the corpus into section-sized chunks so searches return only the relevant blocks
+documents = load_documents()
+
+# "incremental" embeds only new/changed chunks on startup, "recreate" drops and re-embeds everything
+KNOWLEDGE_SYNC_MODE = os.getenv("KNOWLEDGE_SYNC_MODE", "incremental").lower()
+
+# Where chunk vectors are searched: "pgvector" (default), "local" (in-process index
+# mirrored to PgVector) or "memory" (in-process only, no Postgres needed)
+KNOWLEDGE_VECTOR_STORE = os.getenv("KNOWLEDGE_VECTOR_STORE", "pgvector").lower()
 
 # Database connection URL
 db_url = os.getenv("DATABASE_URL", "postgresql+psycopg://ai:ai@localhost:5532/ai")
 
-# Create a knowledge base with the loaded documents
-knowledge_base = DocumentKnowledgeBase(
-    documents=documents,
-    vector_db=PgVector(
+# Vectors are cached on disk so unchanged text is never re-embedded
+embedder = CachedEmbedder(
+    embedder=GeminiEmbedder(id="text-embedding-004", dimensions=768, api_key=API_KEY),
+)
+
+def create_vector_db():
+    """Build the vector store selected by KNOWLEDGE_VECTOR_STORE"""
+    # Every store reranks the same way, so results and their scores don't depend on the store
+    reranker = CohereReranker(model="rerank-v3.5")
+    if KNOWLEDGE_VECTOR_STORE == "memory":
+        return LocalVectorDb(embedder=embedder, search_type=SearchType.hybrid, reranker=reranker)
+
+    pgvector = PgVector(
         table_name="documents",
         db_url=db_url,
         search_type=SearchType.hybrid,
-        embedder=GeminiEmbedder(id="text-embedding-004", dimensions=768, api_key=API_KEY),
-        reranker=CohereReranker(model="rerank-v3.5"),
-    ),
-    
+        embedder=embedder,
+        reranker=reranker,
+    )
+    if KNOWLEDGE_VECTOR_STORE == "local":
+        # The local index reranks its own hits; PgVector is only its write-through mirror
+        return LocalVectorDb(embedder=embedder, mirror=pgvector, search_type=SearchType.hybrid, reranker=reranker)
+    return pgvector
+
+class BudgetedKnowledgeBase(DocumentKnowledgeBase):
+    """Search results trimmed to the calling request's retrieved-knowledge token budget"""
+
+    def search(
+        self, query: str, num_documents: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return fit_retrieved(super().search(query, num_documents, filters))
+
+    async def async_search(
+        self, query: str, num_documents: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return fit_retrieved(await super().async_search(query, num_documents, filters))
+
+# Create a knowledge base with the loaded documents
+knowledge_base = BudgetedKnowledgeBase(
+    documents=documents,
+    vector_db=create_vector_db(),
 )
@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the UI-managed knowledge sections
+KNOWLEDGE_STORE_PATH = os.getenv("KNOWLEDGE_STORE_PATH", "app/knowledge_data/knowledge_store.sqlite3")
+
+# Legacy JSON file, imported once when the store is first created
+LEGACY_KB_FILE = "app/knowledge_data/knowledge_base.json"
+
+DEFAULT_SECTIONS = [
+    {
+        "title": "Application Status",
+        "content": "We have received all of your documents. Your application is under [Pending Initial review/Pending Document Verification]."
+    },
+    {
+        "title": "Deposit Refund Policy",
+        "content": "The deposit is a non-refundable payment unless you were denied your visa. If you were denied your visa you may share the 221G slip and request a refund. For further details, please contact Mr. Neal E Jeffery - njeffery@iit.edu / 312-567-5053."
+    },
+    {
+        "title": "TOEFL/IELTS Requirement",
+        "content": "All international students are required to submit TOEFL/IELTS test scores. If you have a 2-year degree from the United States or if you are from a TOEFL/IELTS waiver-eligible country, then we may waive this requirement. For more information: https://www.iit.edu/admissions-aid/graduate-admission/international-students/application-requirements-and-checklist"
+    }
+]
+
+
+class KnowledgeStore:
+    """Transactional store for knowledge sections.
+
+    Every write is a single SQLite transaction, section IDs come from a
+    counter that never reuses a value, and each section carries a version
+    that increases on update. Reads are served from an in-memory index keyed
+    by ID, which is reloaded only when SQLite reports that another connection
+    (e.g. another worker process) has committed since the last load.
+    """
+
+    def __init__(self, path: str = KNOWLEDGE_STORE_PATH, legacy_file: Optional[str] = LEGACY_KB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            " id TEXT PRIMARY KEY,"
+            " title TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 1,"
+            " position INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._sections: Dict[str, dict] = {}
+        self._loaded_version: Optional[int] = None
+        self._seed(legacy_file)
+        self._load()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE so concurrent writers (other workers) queue instead of interleaving"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _get_meta(self, conn, key: str, default: str = "") -> str:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def _set_meta(self, conn, key: str, value) -> None:
+        conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def _next_id(self, conn) -> str:
+        counter = int(self._get_meta(conn, "id_counter", "0")) + 1
+        self._set_meta(conn, "id_counter", counter)
+        return f"kb-{counter}"
+
+    def _reserve_id(self, conn, section_id: str) -> str:
+        """Keep an imported "kb-N" ID and make sure the counter never hands it out again"""
+        suffix = section_id.rsplit("-", 1)[-1]
+        if section_id.startswith("kb-") and suffix.isdigit() and int(suffix) > int(self._get_meta(conn, "id_counter", "0")):
+            self._set_meta(conn, "id_counter", int(suffix))
+        return section_id
+
+    def _seed(self, legacy_file: Optional[str]) -> None:
+        """Populate an empty store from the legacy JSON file or the default sections"""
+        with self._lock, self._transaction() as conn:
+            if self._get_meta(conn, "seeded"):
+                return
+            sections = DEFAULT_SECTIONS
+            if legacy_file and os.path.exists(legacy_file):
+                try:
+                    with open(legacy_file, "r") as f:
+                        sections = json.load(f)
+                    logger.info(f"Importing {len(sections)} knowledge sections from {legacy_file}")
+                except Exception as e:
+                    logger.error(f"Error reading legacy knowledge base: {str(e)}")
+            self._insert_all(conn, sections)
+            self._set_meta(conn, "seeded", 1)
+
+    def _insert_all(self, conn, sections: List[dict]) -> None:
+        now = time.time()
+        for position, section in enumerate(sections):
+            conn.execute(
+                "INSERT INTO sections (id, title, content, version, position, created_at, updated_at)"
+                " VALUES (?, ?, ?, 1, ?, ?, ?)",
+                (
+                    self._reserve_id(conn, section["id"]) if section.get("id") else self._next_id(conn),
+                    section["title"],
+                    section["content"],
+                    position,
+                    now,
+                    now,
+                ),
+            )
+
+    def _data_version(self) -> int:
+        # Changes whenever a different connection commits; our own writes reload explicitly
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self) -> None:
+        """(Re)build the in-memory index from the database"""
+        with self._lock:
+            self._loaded_version = self._data_version()
+            rows = self._conn.execute(
+                "SELECT id, title, content, version, created_at, updated_at FROM sections ORDER BY position"
+            ).fetchall()
+            self._sections = {row["id"]: dict(row) for row in rows}
+
+    def _refresh(self) -> None:
+        """Reload the index if the database was changed by someone else"""
+        if self._data_version() != self._loaded_version:
+            logger.info("Knowledge store changed on disk, reloading sections")
+            self._load()
+
+    def list_sections(self) -> List[dict]:
+        with self._lock:
+            self._refresh()
+            return [dict(section) for section in self._sections.values()]
+
+    def get(self, section_id: str) -> Optional[dict]:
+        with self._lock:
+            self._refresh()
+            section = self._sections.get(section_id)
+            return dict(section) if section else None
+
+    def create(self, title: str, content: str) -> dict:
+        with self._lock:
+            with self._transaction() as conn:
+                section_id = self._next_id(conn)
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM sections").fetchone()[0]
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO sections (id, title, content, version, position, created_at, updated_at)"
+                    " VALUES (?, ?, ?, 1, ?, ?, ?)",
+                    (section_id, title, content, position, now, now),
+                )
+            self._load()
+            return self.get(section_id)
+
+    def update(self, section_id: str, title: Optional[str] = None, content: Optional[str] = None) -> Optional[dict]:
+        with self._lock:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE sections SET title = COALESCE(?, title), content = COALESCE(?, content),"
+                    " version = version + 1, updated_at = ? WHERE id = ?",
+                    (title, content, time.time(), section_id),
+                )
+            if cursor.rowcount == 0:
+                return None
+            self._load()
+            return self.get(section_id)
+
+    def delete(self, section_id: str) -> bool:
+        with self._lock:
+            with self._transaction() as conn:
+                cursor = conn.execute("DELETE FROM sections WHERE id = ?", (section_id,))
+            if cursor.rowcount == 0:
+                return False
+            self._load()
+            return True
+
+    def replace_all(self, sections: List[dict], owns_static_content: bool = False) -> List[dict]:
+        """Replace every section in one transaction (used when importing a corpus)"""
+        with self._lock:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM sections")
+                self._insert_all(conn, sections)
+                self._set_meta(conn, "owns_static_content", int(owns_static_content))
+            self._load()
+            return self.list_sections()
+
+    @property
+    def owns_static_content(self) -> bool:
+        """True once the static corpus has been imported, so it must not be indexed twice"""
+        with self._lock:
+            return self._get_meta(self._conn, "owns_static_content", "0") == "1"
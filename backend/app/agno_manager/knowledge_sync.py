@@ -0,0 +1,123 @@
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+import zlib
+
+from agno.document.base import Document
+from sqlalchemy import delete, select, text
+
+from .chunking import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key so only one worker syncs the table at a time
+SYNC_LOCK_KEY = zlib.crc32(b"knowledge_sync")
+
+
+def get_stored_hashes(vector_db, section_ids: Optional[Set[str]] = None) -> Dict[str, str]:
+    """Return {id: content_hash} for rows already in the vector table, optionally only some sections"""
+    if hasattr(vector_db, "get_content_hashes"):
+        return vector_db.get_content_hashes(section_ids)
+    table = vector_db.table
+    stmt = select(table.c.id, table.c.content_hash)
+    if section_ids is not None:
+        stmt = stmt.where(table.c.meta_data["section_id"].astext.in_(list(section_ids)))
+    with vector_db.Session() as sess:
+        rows = sess.execute(stmt).all()
+    return {row.id: row.content_hash for row in rows}
+
+
+def top_similarity(vector_db, query: str) -> Optional[float]:
+    """Cosine similarity of the row closest to the query, without keyword search or reranking"""
+    if hasattr(vector_db, "top_similarity"):
+        return vector_db.top_similarity(query)
+    embedding = vector_db.embedder.get_embedding(query)
+    if not embedding:
+        return None
+    distance = vector_db.table.c.embedding.cosine_distance(embedding)
+    with vector_db.Session() as sess:
+        closest = sess.execute(select(distance).order_by(distance).limit(1)).scalar()
+    return 0.0 if closest is None else 1 - float(closest)
+
+
+def delete_ids(vector_db, ids: Iterable[str]) -> int:
+    """Delete rows from the vector table by ID"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    if hasattr(vector_db, "delete_ids"):
+        return vector_db.delete_ids(ids)
+    table = vector_db.table
+    with vector_db.Session() as sess:
+        sess.execute(delete(table).where(table.c.id.in_(ids)))
+        sess.commit()
+    return len(ids)
+
+
+def sync_documents(
+    vector_db,
+    documents: List[Document],
+    prune: bool = True,
+    section_ids: Optional[Set[str]] = None,
+) -> Dict[str, int]:
+    """Bring the vector table in line with documents, embedding only new or changed chunks.
+
+    With section_ids, only chunks belonging to those sections are compared,
+    upserted or deleted; the rest of the table is left alone.
+    """
+    if not vector_db.exists():
+        logger.info("Creating knowledge table")
+        vector_db.create()
+
+    if section_ids is not None:
+        documents = [doc for doc in documents if doc.meta_data.get("section_id") in section_ids]
+    stored = get_stored_hashes(vector_db, section_ids)
+    desired = {doc.id or content_hash(doc.content): doc for doc in documents}
+
+    # A row is current when its ID is still wanted and its content hash still matches
+    to_upsert = [
+        doc for doc_id, doc in desired.items()
+        if stored.get(doc_id) != content_hash(doc.content)
+    ]
+    to_delete = [doc_id for doc_id in stored if doc_id not in desired] if prune else []
+
+    if to_upsert:
+        # Warm the embedding cache in batches; upsert then embeds each chunk from cache
+        if hasattr(vector_db.embedder, "get_embeddings"):
+            vector_db.embedder.get_embeddings([doc.content for doc in to_upsert])
+        vector_db.upsert(documents=to_upsert)
+    delete_ids(vector_db, to_delete)
+
+    stats = {
+        "unchanged": len(desired) - len(to_upsert),
+        "upserted": len(to_upsert),
+        "deleted": len(to_delete),
+    }
+    logger.info(
+        f"Knowledge sync: {stats['upserted']} upserted, {stats['deleted']} deleted, "
+        f"{stats['unchanged']} unchanged"
+    )
+    return stats
+
+
+def sync_knowledge_base(
+    knowledge_base,
+    documents: Optional[List[Document]] = None,
+    section_ids: Optional[Set[str]] = None,
+) -> Dict[str, int]:
+    """Incrementally sync a knowledge base instead of dropping and re-embedding it"""
+    vector_db = knowledge_base.vector_db
+    documents = documents if documents is not None else knowledge_base.documents
+
+    # A local index syncs against whatever Postgres table it mirrors
+    postgres_db = getattr(vector_db, "mirror", vector_db)
+    if postgres_db is None or not hasattr(postgres_db, "db_engine"):
+        return sync_documents(vector_db, documents, section_ids=section_ids)
+
+    # Hold a session-level advisory lock so concurrently booting workers
+    # don't all embed the same missing chunks
+    with postgres_db.db_engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SYNC_LOCK_KEY})
+        try:
+            return sync_documents(vector_db, documents, section_ids=section_ids)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SYNC_LOCK_KEY})
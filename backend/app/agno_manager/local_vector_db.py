@@ -0,0 +1,433 @@
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from agno.document.base import Document
+from agno.embedder.base import Embedder
+from agno.reranker.base import Reranker
+from agno.vectordb.base import VectorDb
+from agno.vectordb.search import SearchType
+from sqlalchemy import select, text
+
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .chunking import content_hash
+
+logger = logging.getLogger(__name__)
+
+# How often a mirrored index checks the mirror for edits made by other workers (seconds); 0 = never
+LOCAL_VECTOR_REFRESH_SECONDS = float(os.getenv("LOCAL_VECTOR_REFRESH_SECONDS", "5"))
+
+
+class LocalVectorDb(VectorDb):
+    """In-process vector store: exact cosine top-k over a float32 matrix held in RAM.
+
+    When a mirror (PgVector) is given, writes go through to it and the local
+    matrix is hydrated from its rows at startup. Other workers write to the
+    same mirror, so every `refresh_seconds` a search compares a digest of the
+    mirror's (id, content_hash) rows with the one last loaded and, when it
+    changed, pulls in only the added or changed rows and drops deleted ones.
+    The hot search path otherwise never leaves the process.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        mirror: Optional[VectorDb] = None,
+        search_type: SearchType = SearchType.vector,
+        reranker: Optional[Reranker] = None,
+        refresh_seconds: float = LOCAL_VECTOR_REFRESH_SECONDS,
+    ):
+        self.embedder = embedder
+        self.dimensions = embedder.dimensions
+        self.mirror = mirror
+        self.search_type = search_type
+        self.reranker = reranker
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.RLock()
+        self._created = False
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._documents: Dict[str, Document] = {}
+        self._hashes: Dict[str, str] = {}
+        self._filters: Dict[str, Dict[str, Any]] = {}
+        # Keyword half of hybrid search, tokenized once at ingest
+        self._keywords = BM25Index()
+        # Row-normalized embeddings, one row per entry in self._ids
+        self._matrix = np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        # Mirror state the matrix reflects: its content_hash per row and a digest of all of them
+        self._mirror_hashes: Dict[str, Optional[str]] = {}
+        self._mirror_version: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.refreshes = 0
+
+    # Index maintenance
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _embed(self, documents: List[Document]) -> None:
+        """Embed documents that don't carry an embedding yet, in one batch when possible"""
+        pending = [doc for doc in documents if not doc.embedding]
+        if not pending:
+            return
+        if hasattr(self.embedder, "get_embeddings"):
+            vectors = self.embedder.get_embeddings([doc.content for doc in pending])
+            for doc, vector in zip(pending, vectors):
+                doc.embedding = vector
+        else:
+            for doc in pending:
+                doc.embed(embedder=self.embedder)
+
+    def _add(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        """Add or replace documents in the in-memory matrix"""
+        documents = [doc for doc in documents if doc.embedding]
+        if not documents:
+            return
+        with self._lock:
+            new_rows = []
+            for doc in documents:
+                doc_id = doc.id or content_hash(doc.content)
+                vector = self._normalize(np.asarray(doc.embedding, dtype=np.float32)[None, :])[0]
+                position = self._positions.get(doc_id)
+                if position is None:
+                    self._positions[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    new_rows.append(vector)
+                elif position < len(self._matrix):
+                    self._matrix[position] = vector
+                else:
+                    # Repeated within this batch, before the matrix was extended
+                    new_rows[position - len(self._matrix)] = vector
+                self._documents[doc_id] = replace(doc, id=doc_id, embedding=None, embedder=None)
+                self._keywords.add(doc_id, doc.content)
+                self._hashes[doc_id] = content_hash(doc.content)
+                self._filters[doc_id] = filters or {}
+            if new_rows:
+                self._matrix = np.vstack([self._matrix, np.vstack(new_rows)])
+
+    def _remove(self, ids: List[str]) -> int:
+        """Drop documents from the in-memory matrix"""
+        with self._lock:
+            doomed = {doc_id for doc_id in ids if doc_id in self._positions}
+            if not doomed:
+                return 0
+            keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in doomed]
+            self._matrix = self._matrix[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            for doc_id in doomed:
+                self._keywords.remove(doc_id)
+                self._documents.pop(doc_id, None)
+                self._hashes.pop(doc_id, None)
+                self._filters.pop(doc_id, None)
+            return len(doomed)
+
+    def _mirror_digest(self) -> Optional[str]:
+        """Version stamp of the mirror table; changes whenever any row is added, changed or deleted"""
+        table = self.mirror.table
+        with self.mirror.Session() as sess:
+            return sess.execute(text(
+                f"SELECT md5(string_agg(id || ':' || coalesce(content_hash, ''), ',' ORDER BY id)) FROM {table.fullname}"
+            )).scalar()
+
+    def _load_rows(self, ids: Optional[List[str]] = None) -> None:
+        """Load rows (with their embeddings) from the mirror table, all of them or only some IDs"""
+        table = self.mirror.table
+        stmt = select(table.c.id, table.c.name, table.c.meta_data, table.c.filters,
+                      table.c.content, table.c.embedding, table.c.content_hash)
+        if ids is not None:
+            stmt = stmt.where(table.c.id.in_(ids))
+        with self.mirror.Session() as sess:
+            rows = sess.execute(stmt).all()
+        documents = [
+            Document(
+                id=row.id,
+                name=row.name,
+                meta_data=row.meta_data or {},
+                content=row.content,
+                embedding=list(row.embedding) if row.embedding is not None else None,
+            )
+            for row in rows
+        ]
+        with self._lock:
+            self._add(documents)
+            for row in rows:
+                if row.id in self._positions:
+                    self._filters[row.id] = row.filters or {}
+                self._mirror_hashes[row.id] = row.content_hash
+
+    def _hydrate_from_mirror(self) -> None:
+        """Load every stored row from the mirror table"""
+        version = self._mirror_digest()
+        with self._lock:
+            self.clear()
+            self._load_rows()
+            self._mirror_version = version
+        self._last_refresh = time.monotonic()
+        logger.info(f"Loaded {len(self._ids)} vectors from {self.mirror.table.fullname} into the local index")
+
+    def refresh(self) -> int:
+        """Apply rows other workers changed in the mirror since the last load; returns rows touched"""
+        if self.mirror is None:
+            return 0
+        version = self._mirror_digest()
+        if version == self._mirror_version:
+            return 0
+        from .knowledge_sync import get_stored_hashes
+        stored = get_stored_hashes(self.mirror)
+        with self._lock:
+            changed = [doc_id for doc_id, digest in stored.items() if self._mirror_hashes.get(doc_id, "") != digest]
+            deleted = [doc_id for doc_id in self._mirror_hashes if doc_id not in stored]
+            self._remove(deleted)
+            for doc_id in deleted:
+                self._mirror_hashes.pop(doc_id, None)
+        if changed:
+            self._load_rows(changed)
+        self._mirror_version = version
+        self.refreshes += 1
+        logger.info(f"Local index refreshed from the mirror: {len(changed)} rows loaded, {len(deleted)} removed")
+        return len(changed) + len(deleted)
+
+    def _maybe_refresh(self) -> None:
+        """Refresh at most every refresh_seconds, without making concurrent searches wait"""
+        if self.mirror is None or not self.refresh_seconds or not self._created:
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_seconds:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_refresh = time.monotonic()
+            self.refresh()
+        except Exception as e:
+            # Keep serving the current index; the next interval tries again
+            logger.warning(f"Could not refresh the local index from the mirror: {str(e)}")
+        finally:
+            self._refresh_lock.release()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids = []
+            self._positions = {}
+            self._documents = {}
+            self._hashes = {}
+            self._filters = {}
+            self._keywords.clear()
+            self._matrix = np.zeros((0, self.dimensions or 0), dtype=np.float32)
+            self._mirror_hashes = {}
+            self._mirror_version = None
+
+    def get_content_hashes(self, section_ids: Optional[Set[str]] = None) -> Dict[str, str]:
+        """Return {id: content_hash} for indexed documents, optionally only some sections"""
+        with self._lock:
+            if section_ids is None:
+                return dict(self._hashes)
+            return {
+                doc_id: digest for doc_id, digest in self._hashes.items()
+                if self._documents[doc_id].meta_data.get("section_id") in section_ids
+            }
+
+    def delete_ids(self, ids: List[str]) -> int:
+        """Delete documents by ID locally and in the mirror"""
+        ids = list(ids)
+        if not ids:
+            return 0
+        if self.mirror is not None:
+            from .knowledge_sync import delete_ids as delete_mirror_ids
+            delete_mirror_ids(self.mirror, ids)
+        return self._remove(ids)
+
+    # VectorDb interface
+
+    def create(self) -> None:
+        if self.mirror is not None:
+            if not self.mirror.exists():
+                self.mirror.create()
+            self._hydrate_from_mirror()
+        self._created = True
+
+    async def async_create(self) -> None:
+        await asyncio.to_thread(self.create)
+
+    def exists(self) -> bool:
+        return self._created
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def doc_exists(self, document: Document) -> bool:
+        with self._lock:
+            return content_hash(document.content) in self._hashes.values()
+
+    async def async_doc_exists(self, document: Document) -> bool:
+        return self.doc_exists(document)
+
+    def name_exists(self, name: str) -> bool:
+        with self._lock:
+            return any(doc.name == name for doc in self._documents.values())
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return id in self._positions
+
+    def insert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self._embed(documents)
+        if self.mirror is not None:
+            self.mirror.insert(documents=documents, filters=filters)
+        self._add(documents, filters=filters)
+
+    async def async_insert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await asyncio.to_thread(self.insert, documents, filters)
+
+    def upsert_available(self) -> bool:
+        return True
+
+    def upsert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self._embed(documents)
+        if self.mirror is not None:
+            self.mirror.upsert(documents=documents, filters=filters)
+        self._add(documents, filters=filters)
+
+    async def async_upsert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await asyncio.to_thread(self.upsert, documents, filters)
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        self._maybe_refresh()
+        if self.search_type == SearchType.keyword:
+            return self.keyword_search(query=query, limit=limit, filters=filters)
+        elif self.search_type == SearchType.hybrid:
+            return self.hybrid_search(query=query, limit=limit, filters=filters)
+        return self.vector_search(query=query, limit=limit, filters=filters)
+
+    async def async_search(
+        self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        # Query embeddings may need a network call, so keep them off the event loop
+        return await asyncio.to_thread(self.search, query, limit, filters)
+
+    def _matches(self, doc_id: str, filters: Optional[Dict[str, Any]]) -> bool:
+        if not filters:
+            return True
+        return all(self._filters[doc_id].get(key) == value for key, value in filters.items())
+
+    def _embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed and normalize the query (outside the lock, it may hit the network)"""
+        query_embedding = self.embedder.get_embedding(query)
+        if not query_embedding:
+            logger.error(f"Error getting embedding for Query: {query}")
+            return None
+        return self._normalize(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+
+    def _vector_scores(self, query_vector: np.ndarray, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """Cosine similarity of the query against every row (filtered rows get -inf)"""
+        scores = self._matrix @ query_vector
+        if filters:
+            mask = np.array([self._matches(doc_id, filters) for doc_id in self._ids])
+            scores = np.where(mask, scores, -np.inf)
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top[np.isfinite(scores[top])]
+
+    def vector_search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Exact cosine top-k with a single matrix-vector product"""
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return []
+        with self._lock:
+            if not self._ids:
+                return []
+            scores = self._vector_scores(query_vector, filters)
+            results = [self._scored(self._ids[i], float(scores[i])) for i in self._top_k(scores, limit)]
+
+        if self.reranker:
+            results = self.reranker.rerank(query=query, documents=results)
+        return results
+
+    def top_similarity(self, query: str) -> Optional[float]:
+        """Cosine similarity of the closest document, without reranking"""
+        self._maybe_refresh()
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return None
+        with self._lock:
+            if not self._ids:
+                return 0.0
+            return float(np.max(self._matrix @ query_vector))
+
+    def keyword_search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """BM25 search over the precomputed inverted index"""
+        with self._lock:
+            hits = self._keywords.search(query, limit, predicate=lambda doc_id: self._matches(doc_id, filters))
+            return [self._scored(doc_id, score) for doc_id, score in hits]
+
+    def hybrid_search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Fuse the vector and BM25 rankings with reciprocal-rank fusion"""
+        # Look deeper than the limit so either ranking can promote a document
+        depth = max(limit * 4, 20)
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return self.keyword_search(query=query, limit=limit, filters=filters)
+        with self._lock:
+            if not self._ids:
+                return []
+            scores = self._vector_scores(query_vector, filters)
+            vector_ranking = [self._ids[i] for i in self._top_k(scores, depth)]
+            keyword_ranking = [
+                doc_id for doc_id, _ in
+                self._keywords.search(query, depth, predicate=lambda doc_id: self._matches(doc_id, filters))
+            ]
+            fused = reciprocal_rank_fusion([vector_ranking, keyword_ranking])[:limit]
+            # Report the cosine similarity so callers can judge retrieval confidence
+            results = [
+                self._scored(doc_id, float(scores[self._positions[doc_id]]), rrf_score=rrf_score)
+                for doc_id, rrf_score in fused
+            ]
+
+        if self.reranker:
+            results = self.reranker.rerank(query=query, documents=results)
+        return results
+
+    def _scored(self, doc_id: str, score: float, **extra: float) -> Document:
+        """Copy a stored document and record its retrieval score in the metadata"""
+        doc = self._documents[doc_id]
+        meta_data = {**doc.meta_data, "score": round(score, 4)}
+        meta_data.update({key: round(value, 4) for key, value in extra.items()})
+        return replace(doc, meta_data=meta_data)
+
+    def drop(self) -> None:
+        if self.mirror is not None:
+            self.mirror.drop()
+        self.clear()
+        self._created = False
+
+    async def async_drop(self) -> None:
+        await asyncio.to_thread(self.drop)
+
+    def get_count(self) -> int:
+        return len(self._ids)
+
+    def optimize(self) -> None:
+        pass
+
+    def delete(self) -> bool:
+        if self.mirror is not None and not self.mirror.delete():
+            return False
+        self.clear()
+        return True
@@ -0,0 +1,94 @@
+from typing import Callable, Iterable, List, Optional, Set
+import asyncio
+import logging
+import os
+import time
+
+from agno.document.base import Document
+
+from .knowledge_sync import sync_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for more edits before re-indexing (seconds)
+REINDEX_DEBOUNCE_SECONDS = float(os.getenv("REINDEX_DEBOUNCE_SECONDS", "2"))
+
+
+class KnowledgeReindexer:
+    """Coalesces knowledge edits into background incremental re-index jobs.
+
+    Endpoints call schedule() with the section IDs they touched. Edits that
+    arrive within the debounce window are merged into a single job, which
+    re-chunks the corpus and syncs only the affected sections into the live
+    vector store (embedding only chunks whose content changed).
+    """
+
+    def __init__(
+        self,
+        knowledge_base,
+        load_documents: Callable[[], List[Document]],
+        on_complete: Optional[Callable[[Set[str]], object]] = None,
+        debounce_seconds: float = REINDEX_DEBOUNCE_SECONDS,
+    ):
+        self.knowledge_base = knowledge_base
+        self.load_documents = load_documents
+        self.on_complete = on_complete
+        self.debounce_seconds = debounce_seconds
+        self.jobs_run = 0
+        self.last_run: Optional[dict] = None
+        self._pending: Set[str] = set()
+        self._full_pending = False
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, section_ids: Optional[Iterable[str]] = None) -> None:
+        """Queue sections for re-indexing; None re-syncs the whole corpus"""
+        if section_ids is None:
+            self._full_pending = True
+        else:
+            self._pending.update(section_ids)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    async def _worker(self) -> None:
+        while self._pending or self._full_pending:
+            # Let rapid successive edits pile up into one batch
+            await asyncio.sleep(self.debounce_seconds)
+            section_ids = None if self._full_pending else set(self._pending)
+            self._pending.clear()
+            self._full_pending = False
+            try:
+                affected = await asyncio.to_thread(self._run, section_ids)
+                if self.on_complete is not None:
+                    # The hook writes shared state, so it stays off the event loop as well
+                    await asyncio.to_thread(self.on_complete, affected)
+            except Exception as e:
+                logger.error(f"Background re-index failed: {str(e)}")
+
+    def _run(self, section_ids: Optional[Set[str]]) -> Set[str]:
+        """Sync the given sections (None = all) and return the section IDs the run touched"""
+        start_time = time.time()
+        # Sections indexed before this run; a full re-sync may delete some of them
+        previous = {doc.meta_data.get("section_id") for doc in self.knowledge_base.documents or []}
+        documents = self.load_documents()
+        self.knowledge_base.documents = documents
+        stats = sync_knowledge_base(self.knowledge_base, documents, section_ids=section_ids)
+
+        self.jobs_run += 1
+        self.last_run = {
+            "sections": sorted(section_ids) if section_ids is not None else "all",
+            "duration": round(time.time() - start_time, 3),
+            **stats,
+        }
+        logger.info(f"Re-indexed knowledge in {self.last_run['duration']}s: {self.last_run}")
+
+        if section_ids is not None:
+            return section_ids
+        # Answers citing a removed section must go too, not only those citing a current one
+        affected = previous | {doc.meta_data.get("section_id") for doc in documents}
+        affected.discard(None)
+        return affected
+
+    async def drain(self) -> None:
+        """Wait for any queued re-index work to finish"""
+        if self._task is not None:
+            await self._task
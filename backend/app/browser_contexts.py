@@ -0,0 +1,60 @@
+from typing import Optional
+import logging
+
+from browser_use import Browser
+from browser_use.browser.context import BrowserContext, BrowserContextConfig, BrowserSession
+
+logger = logging.getLogger(__name__)
+
+
+class IsolatedBrowserContext(BrowserContext):
+    """browser-use context bound to a Playwright context we created and own.
+
+    The Playwright context is opened here rather than by browser-use, which
+    reuses the browser's first context when attached to a running Chrome. The
+    session is handed over through the public ``session`` attribute, so no
+    browser-use internals are overridden.
+    """
+
+    def __init__(self, browser: Browser, playwright_context, config: BrowserContextConfig):
+        super().__init__(browser=browser, config=config)
+        self.session = BrowserSession(context=playwright_context, cached_state=None)
+
+    async def close(self):
+        """Close the Playwright context this object owns"""
+        if self.session is None:
+            return
+        try:
+            await self.session.context.close()
+        except Exception as e:
+            logger.debug(f"Failed to close isolated context: {str(e)}")
+        finally:
+            self.session = None
+
+
+async def new_isolated_context(browser: Browser, config: Optional[BrowserContextConfig] = None) -> IsolatedBrowserContext:
+    """Open a context with its own cookies, storage and tabs, carrying over the Slate sign-in"""
+    config = config or browser.config.new_context_config
+    playwright_browser = await browser.get_playwright_browser()
+
+    storage_state = None
+    if playwright_browser.contexts:
+        try:
+            storage_state = await playwright_browser.contexts[0].storage_state()
+        except Exception as e:
+            logger.warning(f"Could not copy the signed-in session into a new context: {str(e)}")
+
+    playwright_context = await playwright_browser.new_context(
+        storage_state=storage_state,
+        viewport=config.browser_window_size,
+        user_agent=config.user_agent,
+        locale=config.locale,
+        bypass_csp=config.disable_security,
+        ignore_https_errors=config.disable_security,
+    )
+    try:
+        await playwright_context.new_page()
+    except Exception:
+        await playwright_context.close()
+        raise
+    return IsolatedBrowserContext(browser, playwright_context, config)
@@ -0,0 +1,326 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Uvicorn workers on this host (uvicorn reads the same variable as its --workers default)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Browser processes allowed on the whole host, split evenly between the workers; every
+# worker has its own pool, so without this the host runs BROWSER_POOL_SIZE x workers
+BROWSER_HOST_MAX_BROWSERS = int(os.getenv("BROWSER_HOST_MAX_BROWSERS", "0"))
+# Browser processes kept per worker (derived from the host cap when that is set);
+# tasks get isolated contexts inside them
+BROWSER_POOL_SIZE = (
+    max(1, BROWSER_HOST_MAX_BROWSERS // max(WEB_CONCURRENCY, 1)) if BROWSER_HOST_MAX_BROWSERS
+    else int(os.getenv("BROWSER_POOL_SIZE", "1"))
+)
+# Hard cap on contexts (concurrent tasks) open in one browser; further tasks queue
+BROWSER_CONTEXTS_PER_BROWSER = int(os.getenv("BROWSER_CONTEXTS_PER_BROWSER", "4"))
+# Browsers launched at startup so the first tasks skip the Chromium cold start
+BROWSER_POOL_PRELAUNCH = int(os.getenv("BROWSER_POOL_PRELAUNCH", "1"))
+# A browser is retired after serving this many contexts, to shed leaked memory
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "100"))
+# Longest a task waits for a free context before it fails; 0 = no limit
+BROWSER_CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", "600"))
+# How long shutdown waits for busy contexts to come back before closing their browsers anyway
+BROWSER_SHUTDOWN_TIMEOUT = float(os.getenv("BROWSER_SHUTDOWN_TIMEOUT", "30"))
+
+
+class BrowserPoolClosed(Exception):
+    pass
+
+
+class _PooledBrowser:
+    __slots__ = ("browser", "active", "uses", "launched_at", "retiring")
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.active = 0
+        self.uses = 0
+        self.launched_at = time.time()
+        self.retiring = False
+
+
+class BrowserPool:
+    """A few browser processes handing out one isolated context per task.
+
+    Each checkout gets a fresh browser context (its own cookies, storage and
+    tabs) on the least busy of at most `size` browsers, with at most
+    `contexts_per_browser` open in each; tasks beyond that wait in FIFO
+    order. Opening and closing a context takes milliseconds, where launching
+    Chromium takes seconds and hundreds of MB. A browser is health-checked
+    before a context is placed on it and retired once it has served
+    `max_uses` contexts; a replacement may launch while the old one drains.
+    close() shuts every browser down, waiting a bounded time for busy
+    contexts to come back before closing their browsers under them.
+
+    The pool belongs to one worker process. The host total is `size` times
+    the number of uvicorn workers, which is why BROWSER_HOST_MAX_BROWSERS
+    derives `size` from a per-host budget.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        new_context: Callable[[Any], Awaitable[Any]],
+        size: int = BROWSER_POOL_SIZE,
+        contexts_per_browser: int = BROWSER_CONTEXTS_PER_BROWSER,
+        max_uses: int = BROWSER_MAX_USES,
+        checkout_timeout: float = BROWSER_CHECKOUT_TIMEOUT,
+    ):
+        self.factory = factory
+        self.new_context = new_context
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout or None
+        self._browsers: List[_PooledBrowser] = []
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._launching = 0
+        self._closed = False
+        # Browsers being shut down in the background, awaited by close()
+        self._closing: Set[asyncio.Task] = set()
+        # Set by close() and signalled once no context is checked out
+        self._drained: Optional[asyncio.Event] = None
+        self.checkouts = 0
+        self.launches = 0
+        self.recycled = 0
+        self.unhealthy = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.setup_time = 0.0
+        self.teardown_time = 0.0
+        self._busy_time = 0.0
+        self._started_at = time.monotonic()
+
+    @property
+    def capacity(self) -> int:
+        """Contexts that can be open at once"""
+        return self.size * self.contexts_per_browser
+
+    def _open_browsers(self) -> int:
+        """Browsers counting against the size cap (draining ones do not)"""
+        return sum(not entry.retiring for entry in self._browsers) + self._launching
+
+    @staticmethod
+    def _is_healthy(entry: _PooledBrowser) -> bool:
+        playwright_browser = entry.browser.playwright_browser
+        return playwright_browser is not None and playwright_browser.is_connected()
+
+    async def _launch(self) -> _PooledBrowser:
+        """Start Chromium (caller has reserved the slot in _launching)"""
+        try:
+            browser = self.factory()
+            await browser.get_playwright_browser()
+        except Exception:
+            self._launching -= 1
+            self._dispatch()
+            raise
+        self._launching -= 1
+        self.launches += 1
+        entry = _PooledBrowser(browser)
+        self._browsers.append(entry)
+        logger.info(f"Launched browser {self._open_browsers()}/{self.size}")
+        return entry
+
+    async def _close_browser(self, entry: _PooledBrowser) -> None:
+        try:
+            await entry.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {str(e)}")
+
+    def _retire(self, entry: _PooledBrowser) -> None:
+        """Stop placing contexts on a browser and close it once its contexts are done"""
+        entry.retiring = True
+        if entry.active == 0 and entry in self._browsers:
+            self._browsers.remove(entry)
+            self._close_in_background(entry)
+
+    def _close_in_background(self, entry: _PooledBrowser) -> None:
+        task = asyncio.ensure_future(self._close_browser(entry))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _assign(self, entry: _PooledBrowser) -> _PooledBrowser:
+        """Take a context slot on the browser, retiring it once it reaches max_uses"""
+        entry.active += 1
+        entry.uses += 1
+        if entry.uses >= self.max_uses and not entry.retiring:
+            self.recycled += 1
+            entry.retiring = True
+        return entry
+
+    def _place(self) -> Optional[_PooledBrowser]:
+        """Least busy healthy browser with room for another context"""
+        best = None
+        for entry in list(self._browsers):
+            if entry.retiring or entry.active >= self.contexts_per_browser:
+                continue
+            if not self._is_healthy(entry):
+                self.unhealthy += 1
+                logger.warning("Retiring a browser whose connection was lost")
+                self._retire(entry)
+                continue
+            if best is None or entry.active < best.active:
+                best = entry
+        return best
+
+    def _dispatch(self) -> None:
+        """Wake waiters while there is room in a browser or for a new one"""
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            entry = self._place()
+            if entry is not None:
+                waiter.set_result(self._assign(entry))
+            elif self._open_browsers() < self.size:
+                # The waiter launches a browser in this slot
+                self._launching += 1
+                waiter.set_result(None)
+            else:
+                return
+            self._waiters.popleft()
+
+    async def start(self, count: int = BROWSER_POOL_PRELAUNCH) -> None:
+        """Pre-launch browsers; failures are logged and left to lazy launch"""
+        while self._open_browsers() < min(count, self.size):
+            self._launching += 1
+            try:
+                await self._launch()
+            except Exception as e:
+                logger.error(f"Failed to pre-launch browser: {str(e)}")
+                break
+            self._dispatch()
+
+    async def _launch_for_caller(self) -> _PooledBrowser:
+        entry = self._assign(await self._launch())
+        # Let waiters share the new browser's other context slots
+        self._dispatch()
+        return entry
+
+    async def _acquire(self) -> _PooledBrowser:
+        if self._closed:
+            raise BrowserPoolClosed("Browser pool is shut down")
+        if not self._waiters:
+            entry = self._place()
+            if entry is not None:
+                return self._assign(entry)
+            if self._open_browsers() < self.size:
+                self._launching += 1
+                return await self._launch_for_caller()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            entry = await asyncio.wait_for(waiter, timeout=self.checkout_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a context slot or a launch slot just as the caller went away
+                if waiter.result() is None:
+                    self._launching -= 1
+                    self._dispatch()
+                else:
+                    self._release(waiter.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if entry is None:
+            entry = await self._launch_for_caller()
+        return entry
+
+    def _release(self, entry: _PooledBrowser) -> None:
+        entry.active -= 1
+        if not (self._closed or entry.retiring) and not self._is_healthy(entry):
+            self.unhealthy += 1
+            entry.retiring = True
+        if self._closed or entry.retiring:
+            self._retire(entry)
+        if self._drained is not None and not any(entry.active for entry in self._browsers):
+            self._drained.set()
+        self._dispatch()
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[Any]:
+        """Hold an isolated browser context for the duration of the block"""
+        start_time = time.monotonic()
+        entry = await self._acquire()
+        waited = time.monotonic() - start_time
+        setup_start = time.monotonic()
+        try:
+            context = await self.new_context(entry.browser)
+        except Exception:
+            self._release(entry)
+            raise
+        self.setup_time += time.monotonic() - setup_start
+        self.checkouts += 1
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        busy_since = time.monotonic()
+        try:
+            yield context
+        finally:
+            teardown_start = time.monotonic()
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser context: {str(e)}")
+            finally:
+                self.teardown_time += time.monotonic() - teardown_start
+                self._busy_time += time.monotonic() - busy_since
+                self._release(entry)
+
+    async def close(self, timeout: float = BROWSER_SHUTDOWN_TIMEOUT) -> None:
+        """Close every browser, giving busy contexts up to timeout seconds to come back first"""
+        self._closed = True
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(BrowserPoolClosed("Browser pool is shut down"))
+        self._waiters.clear()
+        self._drained = asyncio.Event()
+        # Idle browsers close now, busy ones as soon as their last context is returned
+        for entry in list(self._browsers):
+            self._retire(entry)
+        busy = len(self._browsers)
+        if busy:
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Closing {len(self._browsers)} browsers with contexts still in use")
+                for entry in list(self._browsers):
+                    self._browsers.remove(entry)
+                    self._close_in_background(entry)
+        while self._closing:
+            await asyncio.gather(*list(self._closing))
+        logger.info(f"Closed all browsers ({busy} were in use at shutdown)")
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self._started_at
+        in_use = sum(entry.active for entry in self._browsers)
+        return {
+            "size": self.size,
+            "contexts_per_browser": self.contexts_per_browser,
+            "capacity": self.capacity,
+            "browsers": len(self._browsers),
+            "launching": self._launching,
+            "contexts_in_use": in_use,
+            "waiting": len(self._waiters),
+            "checkouts": self.checkouts,
+            "launches": self.launches,
+            "recycled": self.recycled,
+            "unhealthy": self.unhealthy,
+            "avg_wait": round(self.wait_time / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_wait": round(self.max_wait_time, 3),
+            "avg_context_setup_ms": round(self.setup_time / self.checkouts * 1000, 1) if self.checkouts else 0.0,
+            "avg_context_teardown_ms": round(self.teardown_time / self.checkouts * 1000, 1) if self.checkouts else 0.0,
+            "utilization": round(in_use / self.capacity, 3) if self.capacity else 0.0,
+            # Share of total context capacity spent on tasks since startup
+            "busy_ratio": round(self._busy_time / (uptime * self.capacity), 4) if uptime and self.capacity else 0.0,
+        }
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import uuid4
+import logging
+import os
+import threading
+import time
+
+from app.shared_state import SharedDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for invalidations made by other workers
+CACHE_INVALIDATION_POLL = float(os.getenv("CACHE_INVALIDATION_POLL", "1"))
+# Recent invalidations kept for workers to catch up on
+CACHE_INVALIDATION_LOG_SIZE = 1000
+# Section -> cached keys index; longer than any cache TTL so no live answer loses its tag
+CACHE_DEPENDENCY_TTL = 24 * 3600
+# Keys remembered per section; the oldest (long expired) ones fall off first
+CACHE_DEPENDENCY_MAX_KEYS = 5000
+
+
+def referenced_section_ids(run_response: Any) -> Set[str]:
+    """Collect the knowledge section IDs an agent run retrieved"""
+    section_ids: Set[str] = set()
+    extra_data = getattr(run_response, "extra_data", None)
+    for references in getattr(extra_data, "references", None) or []:
+        for doc in references.references or []:
+            section_id = (doc.get("meta_data") or {}).get("section_id")
+            if section_id:
+                section_ids.add(section_id)
+    return section_ids
+
+
+class CacheDependencies:
+    """Tracks which cached answers were built from which knowledge sections.
+
+    Caches register an evict callback under a name and record the sections
+    behind each key they store. Editing a section then evicts only the
+    answers that depended on it.
+
+    Answers are cached by every worker, so the section -> key index also lives
+    in the shared state backend, and each invalidation is appended to a shared
+    log. Every worker polls the log (at most every CACHE_INVALIDATION_POLL
+    seconds, from cache lookups) and drops its local copies of the listed keys.
+    """
+
+    def __init__(self, index: Optional[SharedDict] = None, log: Optional[SharedDict] = None):
+        self._lock = threading.Lock()
+        self._evictors: Dict[str, Callable[[str], Any]] = {}
+        self._local_evictors: Dict[str, Callable[[str], Any]] = {}
+        self._keys_by_section: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self._sections_by_key: Dict[Tuple[str, str], Set[str]] = {}
+        self._index = index or SharedDict("cache_dependencies", ttl=CACHE_DEPENDENCY_TTL)
+        self._log = log or SharedDict("cache_invalidations")
+        self._applied: Set[str] = set()
+        self._last_poll = 0.0
+        self.remote_evictions = 0
+
+    def register(
+        self, cache_name: str, evict: Callable[[str], Any], evict_local: Optional[Callable[[str], Any]] = None
+    ) -> None:
+        """Register how to evict a key from a named cache.
+
+        evict removes the key everywhere (local copy and shared entry);
+        evict_local only drops this worker's copy, for invalidations another
+        worker already applied to the shared entry. Caches with no shared
+        part pass evict alone.
+        """
+        self._evictors[cache_name] = evict
+        self._local_evictors[cache_name] = evict_local or evict
+
+    def record(self, cache_name: str, key: str, section_ids: Iterable[str]) -> None:
+        """Remember the sections a cached answer was built from"""
+        section_ids = set(section_ids)
+        if not section_ids:
+            return
+        with self._lock:
+            self._forget((cache_name, key))
+            self._sections_by_key[(cache_name, key)] = section_ids
+            for section_id in section_ids:
+                self._keys_by_section[section_id].add((cache_name, key))
+        try:
+            for section_id in section_ids:
+                self._index.append(section_id, [cache_name, key], max_items=CACHE_DEPENDENCY_MAX_KEYS)
+        except Exception as e:
+            # Still tracked in this worker; only other workers' invalidations miss it
+            logger.warning(f"Could not share cache dependencies for {cache_name}: {str(e)}")
+
+    def forget(self, cache_name: str, key: str) -> None:
+        """Drop tracking for a key the cache evicted on its own"""
+        with self._lock:
+            self._forget((cache_name, key))
+
+    def _forget(self, entry: Tuple[str, str]) -> None:
+        for section_id in self._sections_by_key.pop(entry, ()):
+            keys = self._keys_by_section.get(section_id)
+            if keys is not None:
+                keys.discard(entry)
+                if not keys:
+                    del self._keys_by_section[section_id]
+
+    def invalidate_sections(self, section_ids: Iterable[str]) -> int:
+        """Evict every cached answer, in any worker, that depended on any of the given sections"""
+        section_ids = set(section_ids)
+        with self._lock:
+            doomed = set()
+            for section_id in section_ids:
+                doomed |= self._keys_by_section.get(section_id, set())
+            for entry in doomed:
+                self._forget(entry)
+        try:
+            for section_id in section_ids:
+                doomed |= {(cache_name, key) for cache_name, key in self._index.pop(section_id) or []}
+        except Exception as e:
+            logger.warning(f"Could not read shared cache dependencies: {str(e)}")
+
+        for cache_name, key in doomed:
+            evict = self._evictors.get(cache_name)
+            if evict is not None:
+                evict(key)
+        if doomed:
+            self._publish(doomed)
+            logger.info(f"Invalidated {len(doomed)} cached answers for sections {sorted(section_ids)}")
+        return len(doomed)
+
+    def _publish(self, entries: Set[Tuple[str, str]]) -> None:
+        """Tell the other workers which keys to drop from their local copies"""
+        invalidation_id = uuid4().hex
+        with self._lock:
+            self._applied.add(invalidation_id)
+        try:
+            self._log.append(
+                "log",
+                {"id": invalidation_id, "at": time.time(), "entries": [list(entry) for entry in entries]},
+                max_items=CACHE_INVALIDATION_LOG_SIZE,
+            )
+        except Exception as e:
+            logger.warning(f"Could not broadcast a cache invalidation: {str(e)}")
+
+    def poll(self, force: bool = False) -> int:
+        """Apply invalidations other workers published since the last poll; returns keys evicted"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_poll < CACHE_INVALIDATION_POLL:
+                return 0
+            self._last_poll = now
+        try:
+            log: List[Dict[str, Any]] = self._log.get("log") or []
+        except Exception as e:
+            logger.warning(f"Could not read cache invalidations: {str(e)}")
+            return 0
+        with self._lock:
+            pending = [item for item in log if item["id"] not in self._applied]
+            # Only IDs still in the log can show up again
+            self._applied = {item["id"] for item in log}
+        evicted = 0
+        for item in pending:
+            for cache_name, key in item["entries"]:
+                evict = self._local_evictors.get(cache_name)
+                if evict is not None:
+                    evict(key)
+                    self.forget(cache_name, key)
+                    evicted += 1
+        if evicted:
+            self.remote_evictions += evicted
+            logger.info(f"Dropped {evicted} local cache entries invalidated by another worker")
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys_by_section.clear()
+            self._sections_by_key.clear()
+        self._index.clear()
+
+
+# Shared by the chat, email and semantic caches
+cache_dependencies = CacheDependencies()
@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional, Sequence, Set
+import asyncio
+import logging
+import os
+
+from agno.models.message import Message as ModelMessage
+
+from app.session_store import SESSION_IDLE_TTL
+from app.shared_state import SharedDict
+from app.token_budget import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens of conversation history (summary + recent turns) allowed in a chat prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))
+# Upper bound on the rolling summary itself
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "250"))
+# Per-message cap when feeding old turns to the summarizer (pasted emails can be huge)
+SUMMARY_INPUT_MESSAGE_TOKENS = 400
+SUMMARY_TIMEOUT = 30  # seconds
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a student and an "
+    "Illinois Tech enrollment counselor. Update the summary with the new messages. "
+    "Keep facts the counselor needs later (program, term, application status, "
+    "questions already answered, documents mentioned). At most {words} words, plain text.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+)
+
+
+class ConversationSummarizer:
+    """Keeps a rolling summary of each session's older turns.
+
+    Each summary records the timestamp of the last message it covers.
+    Prompts get the summary plus the newer messages verbatim, newest first
+    until the token budget is used up. After each response, summarize()
+    folds everything except the latest turn into the summary, off the
+    request path.
+    """
+
+    def __init__(
+        self,
+        model,
+        history_budget: int = HISTORY_TOKEN_BUDGET,
+        summary_budget: int = SUMMARY_TOKEN_BUDGET,
+    ):
+        self.model = model
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self._summaries = SharedDict("chat_summaries", ttl=SESSION_IDLE_TTL)
+        self._running: Set[str] = set()
+
+    def _state(self, session_id: str) -> Dict:
+        return self._summaries.get(session_id) or {"summary": "", "through": 0.0}
+
+    def build_context(self, session_id: str, records: Sequence) -> str:
+        """Summary of older turns plus as many recent messages as fit the budget"""
+        state = self._state(session_id)
+        summary = state["summary"]
+        budget = self.history_budget - estimate_tokens(summary)
+
+        through = state["through"]
+        recent = [r for r in records if r[2] > through] if through else list(records)
+        lines: List[str] = []
+        for role, content, _ in reversed(recent):
+            line = f"{role}: {content}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                # Always keep part of the latest message rather than nothing
+                if not lines and budget > 0:
+                    lines.append(truncate_to_tokens(line, budget))
+                break
+            lines.append(line)
+            budget -= cost
+
+        context = f"Summary of earlier conversation: {summary}\n" if summary else ""
+        return context + "".join(f"{line}\n" for line in reversed(lines))
+
+    async def summarize(self, session_id: str, records: Optional[Sequence]) -> None:
+        """Fold all but the latest turn into the session's summary"""
+        if not records or session_id in self._running:
+            return
+        state = await asyncio.to_thread(self._state, session_id)
+        # The latest user/assistant exchange stays verbatim
+        older = [r for r in records[:-2] if r[2] > state["through"]]
+        if not older:
+            return
+
+        self._running.add(session_id)
+        try:
+            messages = "\n".join(
+                f"{role}: {truncate_to_tokens(content, SUMMARY_INPUT_MESSAGE_TOKENS)}"
+                for role, content, _ in older
+            )
+            prompt = SUMMARY_PROMPT.format(
+                words=int(self.summary_budget * 0.75),
+                summary=state["summary"] or "(none yet)",
+                messages=messages,
+            )
+            response = await asyncio.wait_for(
+                self.model.aresponse([ModelMessage(role="user", content=prompt)]),
+                timeout=SUMMARY_TIMEOUT,
+            )
+            summary = truncate_to_tokens((response.content or "").strip(), self.summary_budget)
+            if summary:
+                await self._summaries.aset(session_id, {"summary": summary, "through": older[-1][2]})
+                logger.info(f"Summarized {len(older)} messages of session {session_id} ({estimate_tokens(summary)} tokens)")
+        except Exception as e:
+            # The next turn simply retries; until then the recent messages are used as-is
+            logger.warning(f"Conversation summary failed for {session_id}: {str(e)}")
+        finally:
+            self._running.discard(session_id)
+
+    def forget(self, session_id: str) -> None:
+        self._summaries.pop(session_id)
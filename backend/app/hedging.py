@@ -0,0 +1,166 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Hedging is opt-in: it trades extra model calls for a shorter latency tail
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# A second call starts once the first has run longer than this percentile of recent latencies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Extra calls allowed, as a fraction of all calls (0.05 = at most 5% more calls)
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+# Latencies remembered per key, and how many are needed before hedging starts
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """Hedged requests: race a second identical call against a slow first one.
+
+    Latencies are tracked per key (e.g. "chat:standard"). call(started)
+    calls started() once it holds its model slot and agent, right before the
+    model call; the latency and the hedge clock run from there, so time spent
+    queueing never looks like a slow model. Once the model call has taken
+    longer than the configured percentile of its key's recent calls, a
+    duplicate is started and whichever succeeds first wins; the other is
+    cancelled. No duplicate starts while can_hedge() is false (e.g. other
+    requests are queued for a slot the duplicate would take), and duplicates
+    are capped globally at `budget` times the number of calls, so hedging can
+    never more than slightly raise model usage.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_HEDGE_ENABLED,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        budget: float = LLM_HEDGE_BUDGET,
+        window: int = LLM_HEDGE_WINDOW,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self.busy_skipped = 0
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds after which to hedge, or None until enough latencies are known"""
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def _record(self, key: str, latency: float) -> None:
+        samples = self._latencies.get(key)
+        if samples is None:
+            samples = self._latencies[key] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def _within_budget(self) -> bool:
+        return self.hedged + 1 <= self.budget * self.calls
+
+    @staticmethod
+    def _start(call: Callable[[Callable[[], None]], Awaitable[T]]) -> Tuple[asyncio.Future, asyncio.Event, List[float]]:
+        """Run call in a task; the event is set, and the time noted, when it calls started()"""
+        started = asyncio.Event()
+        started_at: List[float] = []
+
+        def mark_started() -> None:
+            if not started.is_set():
+                started_at.append(time.monotonic())
+                started.set()
+
+        return asyncio.ensure_future(call(mark_started)), started, started_at
+
+    async def run(
+        self,
+        key: str,
+        call: Callable[[Callable[[], None]], Awaitable[T]],
+        can_hedge: Optional[Callable[[], bool]] = None,
+    ) -> T:
+        """Await call(started), starting a duplicate if its model call runs past the hedge delay"""
+        if not self.enabled:
+            return await call(lambda: None)
+
+        self.calls += 1
+        primary, primary_started, primary_started_at = self._start(call)
+        tasks = [primary]
+        started_at = {primary: primary_started_at}
+        try:
+            delay = self.hedge_delay(key)
+            if delay is not None:
+                # Queueing for the slot does not count towards the delay
+                waiting = asyncio.ensure_future(primary_started.wait())
+                try:
+                    await asyncio.wait([primary, waiting], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiting.cancel()
+                if not primary.done():
+                    await asyncio.wait(tasks, timeout=delay)
+                if not primary.done():
+                    if can_hedge is not None and not can_hedge():
+                        self.busy_skipped += 1
+                    elif self._within_budget():
+                        self.hedged += 1
+                        logger.info(f"Hedging {key} call after {delay:.2f}s")
+                        hedge, _, hedge_started_at = self._start(call)
+                        tasks.append(hedge)
+                        started_at[hedge] = hedge_started_at
+                    else:
+                        self.budget_denied += 1
+
+            # The first call to succeed wins; a failure only counts once both have failed
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self._record_call(key, started_at[task])
+                        return task.result()
+                    error = error or task.exception()
+            self._record_call(key, started_at[primary])
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing call's failure as handled
+                    task.exception()
+
+    def _record_call(self, key: str, started_at: List[float]) -> None:
+        """Record a model call's latency; calls that never got a slot tell nothing about the model"""
+        if started_at:
+            self._record(key, time.monotonic() - started_at[0])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "busy_skipped": self.busy_skipped,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "hedge_delays": {key: self.hedge_delay(key) for key in self._latencies},
+        }
+
+
+llm_hedger = Hedger()
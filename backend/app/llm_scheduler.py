@@ -0,0 +1,175 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Gemini calls allowed at once in this worker, across all classes
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Request classes, highest priority first: (concurrency, queue length, max queue wait in seconds; 0 = no limit)
+LLM_CLASS_DEFAULTS = {
+    "chat": (8, 32, 5.0),
+    "email": (4, 16, 60.0),
+    "bulk": (2, 100, 0.0),
+}
+
+
+def _class_config(name: str) -> tuple:
+    """Defaults overridable per class, e.g. LLM_BULK_CONCURRENCY=1"""
+    concurrency, queue, max_wait = LLM_CLASS_DEFAULTS[name]
+    prefix = f"LLM_{name.upper()}"
+    return (
+        int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+    )
+
+
+class LLMSchedulerBusy(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Too many {priority} requests in progress, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _RequestClass:
+    __slots__ = ("name", "limit", "max_queue", "max_wait", "active", "waiters",
+                 "service_time", "admitted", "rejected", "wait_time")
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait or None
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.service_time = 5.0  # moving average of seconds per call, seeds Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+
+
+class LLMScheduler:
+    """Admission control and priority scheduling for model calls.
+
+    Each request class (chat, email, bulk) has its own concurrency cap and a
+    bounded FIFO queue. When a slot frees up, the highest-priority class
+    with waiters that is under its cap goes next, so bulk jobs only use what
+    interactive traffic leaves and can never take more than their cap. A full
+    queue, or a wait longer than the class allows, is rejected straight away
+    with a retry hint instead of timing out later.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, classes: Optional[Dict[str, tuple]] = None):
+        self.max_concurrency = max_concurrency
+        classes = classes or {name: _class_config(name) for name in LLM_CLASS_DEFAULTS}
+        # Dicts keep insertion order, which is the priority order
+        self._classes = {name: _RequestClass(name, *config) for name, config in classes.items()}
+        self._active = 0
+
+    def _can_run(self, request_class: _RequestClass) -> bool:
+        return self._active < self.max_concurrency and request_class.active < request_class.limit
+
+    def _retry_after(self, request_class: _RequestClass) -> int:
+        backlog = len(request_class.waiters) + 1
+        return max(1, math.ceil(backlog / max(request_class.limit, 1) * request_class.service_time))
+
+    def _grant(self, request_class: _RequestClass) -> None:
+        request_class.active += 1
+        request_class.admitted += 1
+        self._active += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, highest priority first"""
+        for request_class in self._classes.values():
+            while request_class.waiters and self._can_run(request_class):
+                waiter = request_class.waiters.popleft()
+                if waiter.done():
+                    # Gave up waiting
+                    continue
+                self._grant(request_class)
+                waiter.set_result(None)
+
+    def admit(self, priority: str) -> None:
+        """Reject up front if a request of this class would not even get a queue place"""
+        request_class = self._classes[priority]
+        if not self._can_run(request_class) and len(request_class.waiters) >= request_class.max_queue:
+            request_class.rejected += 1
+            raise LLMSchedulerBusy(priority, self._retry_after(request_class))
+
+    def queued(self, priority: str) -> int:
+        """Requests of this class waiting for a slot"""
+        return len(self._classes[priority].waiters)
+
+    async def acquire(self, priority: str) -> None:
+        request_class = self._classes[priority]
+        if not request_class.waiters and self._can_run(request_class):
+            self._grant(request_class)
+            return
+        self.admit(priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        request_class.waiters.append(waiter)
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=request_class.max_wait)
+            request_class.wait_time += time.monotonic() - start_time
+        except asyncio.TimeoutError:
+            request_class.rejected += 1
+            logger.warning(f"{priority} request waited {request_class.max_wait:.1f}s for a model slot, rejecting")
+            raise LLMSchedulerBusy(priority, self._retry_after(request_class))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as the caller went away
+                self.release(priority)
+            raise
+        finally:
+            if waiter in request_class.waiters:
+                request_class.waiters.remove(waiter)
+
+    def release(self, priority: str, elapsed: Optional[float] = None) -> None:
+        request_class = self._classes[priority]
+        request_class.active -= 1
+        self._active -= 1
+        if elapsed is not None:
+            request_class.service_time = 0.8 * request_class.service_time + 0.2 * elapsed
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str) -> AsyncIterator[None]:
+        """Hold a model slot of the given class for the duration of the block"""
+        await self.acquire(priority)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(priority, time.monotonic() - start_time)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "classes": {
+                name: {
+                    "active": request_class.active,
+                    "limit": request_class.limit,
+                    "queued": len(request_class.waiters),
+                    "admitted": request_class.admitted,
+                    "rejected": request_class.rejected,
+                    "avg_wait": round(request_class.wait_time / request_class.admitted, 4) if request_class.admitted else 0.0,
+                    "avg_service_time": round(request_class.service_time, 2),
+                }
+                for name, request_class in self._classes.items()
+            },
+        }
+
+
+llm_scheduler = LLMScheduler()
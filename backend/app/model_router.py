@@ -0,0 +1,186 @@
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import logging
+import os
+import time
+
+from app.agno_manager.knowledge_base import knowledge_base
+from app.agno_manager.knowledge_sync import top_similarity
+from app.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+FAST, STANDARD, STRONG = "fast", "standard", "strong"
+
+# Cheapest model, for short questions the knowledge base clearly answers and as the timeout fallback
+ROUTER_FAST_MODEL = os.getenv("ROUTER_FAST_MODEL", "gemini-2.0-flash-lite")
+# Escalation target for weak retrieval, long emails and multi-part questions
+ROUTER_STRONG_MODEL = os.getenv("ROUTER_STRONG_MODEL", "gemini-2.5-pro-preview-03-25")
+# The probe scores retrieval by raw cosine similarity to the closest chunk (never a reranker
+# score, which is on another scale). At or above this a short question goes to the fast model
+ROUTER_CONFIDENT_SIMILARITY = float(os.getenv("ROUTER_CONFIDENT_SIMILARITY", "0.75"))
+# Closest-chunk similarity below which the question is escalated
+ROUTER_LOW_SIMILARITY = float(os.getenv("ROUTER_LOW_SIMILARITY", "0.55"))
+ROUTER_SHORT_QUERY_TOKENS = int(os.getenv("ROUTER_SHORT_QUERY_TOKENS", "40"))
+ROUTER_LONG_QUERY_TOKENS = int(os.getenv("ROUTER_LONG_QUERY_TOKENS", "400"))
+# More question marks than this counts as a multi-part question
+ROUTER_MAX_QUESTIONS = int(os.getenv("ROUTER_MAX_QUESTIONS", "2"))
+# Deadline for the fast-model retry after the primary call times out
+ROUTER_FALLBACK_TIMEOUT = float(os.getenv("ROUTER_FALLBACK_TIMEOUT", "10"))
+# Recent decisions kept for /api/admin/llm-stats
+ROUTER_HISTORY_SIZE = 100
+
+T = TypeVar("T")
+
+
+@dataclass
+class RouteDecision:
+    path: str
+    tier: str
+    model: str
+    reason: str
+    confidence: Optional[float] = None
+    fallback_model: Optional[str] = None
+    latency: Optional[float] = None
+    outcome: str = "pending"
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class ModelRouter:
+    """Picks a model tier for each request and falls back when it is slow.
+
+    Short, single questions with a strong knowledge-base hit go to the fast
+    model. Weak retrieval, long texts and multi-part questions go to the
+    strong model. Everything else stays on the code path's usual model. If
+    the chosen call misses its deadline it is retried once on the fast model.
+    """
+
+    def __init__(self, knowledge, fast_model: str = ROUTER_FAST_MODEL, strong_model: str = ROUTER_STRONG_MODEL):
+        self.knowledge = knowledge
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self._models: Dict[str, Dict[str, str]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._latency: Dict[str, Dict[str, float]] = {}
+        self.fallbacks = 0
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=ROUTER_HISTORY_SIZE)
+
+    def register(self, path: str, standard_model: str) -> Dict[str, str]:
+        """Declare a code path and its usual model; returns the model for each tier"""
+        models = {FAST: self.fast_model, STANDARD: standard_model, STRONG: self.strong_model}
+        self._models[path] = models
+        self._counts[path] = {tier: 0 for tier in models}
+        self._latency[path] = {tier: 0.0 for tier in models}
+        return models
+
+    async def _probe(self, question: str) -> Optional[float]:
+        """Cosine similarity of the closest knowledge chunk.
+
+        One nearest-neighbour lookup with no keyword search or rerank; the
+        question's embedding is cached for the agent's own search.
+        """
+        try:
+            return await asyncio.to_thread(top_similarity, self.knowledge.vector_db, question)
+        except Exception as e:
+            logger.warning(f"Retrieval probe failed, routing without it: {str(e)}")
+            return None
+
+    async def route(self, path: str, question: str) -> RouteDecision:
+        tokens = estimate_tokens(question)
+        questions = question.count("?")
+        confidence = None
+        if tokens > ROUTER_LONG_QUERY_TOKENS:
+            tier, reason = STRONG, f"long text ({tokens} tokens)"
+        elif questions > ROUTER_MAX_QUESTIONS:
+            tier, reason = STRONG, f"{questions} questions"
+        else:
+            confidence = await self._probe(question)
+            if confidence is None:
+                tier, reason = STANDARD, "no retrieval score"
+            elif confidence < ROUTER_LOW_SIMILARITY:
+                tier, reason = STRONG, "low retrieval confidence"
+            elif tokens <= ROUTER_SHORT_QUERY_TOKENS and questions <= 1 and confidence >= ROUTER_CONFIDENT_SIMILARITY:
+                tier, reason = FAST, "short question, confident retrieval"
+            else:
+                tier, reason = STANDARD, "default"
+        return RouteDecision(path, tier, self._models[path][tier], reason, confidence)
+
+    def fallback_tier(self, decision: RouteDecision) -> Optional[str]:
+        """Tier to retry on after a missed deadline, if any"""
+        return FAST if decision.tier != FAST else None
+
+    def record(self, decision: RouteDecision, outcome: str, fallback_tier: Optional[str] = None) -> None:
+        """Log the decision with its latency and outcome and add it to the stats"""
+        decision.latency = time.monotonic() - decision.started_at
+        decision.outcome = outcome
+        if fallback_tier is not None:
+            decision.fallback_model = self._models[decision.path][fallback_tier]
+            self.fallbacks += 1
+        self._counts[decision.path][decision.tier] += 1
+        self._latency[decision.path][decision.tier] += decision.latency
+        confidence = f"{decision.confidence:.2f}" if decision.confidence is not None else "n/a"
+        logger.info(
+            f"Routed {decision.path} to {decision.tier} ({decision.model}): {decision.reason}, "
+            f"confidence={confidence}, "
+            + (f"fell back to {decision.fallback_model}, " if decision.fallback_model else "")
+            + f"{outcome} in {decision.latency:.2f}s"
+        )
+        entry = asdict(decision)
+        del entry["started_at"]
+        entry["latency"] = round(decision.latency, 3)
+        self._recent.append(entry)
+
+    async def run(
+        self,
+        decision: RouteDecision,
+        call: Callable[[str, float], Awaitable[T]],
+        timeout: float,
+        fallback_timeout: float = ROUTER_FALLBACK_TIMEOUT,
+    ) -> T:
+        """Run call(tier, timeout) on the chosen tier, retrying on the fast tier after a timeout.
+
+        call must raise asyncio.TimeoutError when its deadline passes.
+        """
+        try:
+            result = await call(decision.tier, timeout)
+        except asyncio.TimeoutError:
+            fallback = self.fallback_tier(decision)
+            if fallback is None:
+                self.record(decision, "timeout")
+                raise
+            logger.warning(f"{decision.path} call on {decision.model} missed its {timeout:g}s deadline, falling back")
+            try:
+                result = await call(fallback, fallback_timeout)
+            except BaseException as e:
+                self.record(decision, "timeout" if isinstance(e, asyncio.TimeoutError) else "error", fallback)
+                raise
+            self.record(decision, "ok", fallback)
+            return result
+        except BaseException:
+            self.record(decision, "error")
+            raise
+        self.record(decision, "ok")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fallbacks": self.fallbacks,
+            "paths": {
+                path: {
+                    tier: {
+                        "model": models[tier],
+                        "requests": self._counts[path][tier],
+                        "avg_latency": round(self._latency[path][tier] / self._counts[path][tier], 3)
+                        if self._counts[path][tier] else 0.0,
+                    }
+                    for tier in models
+                }
+                for path, models in self._models.items()
+            },
+            "recent": list(self._recent),
+        }
+
+
+model_router = ModelRouter(knowledge_base)
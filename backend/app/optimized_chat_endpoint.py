@@ -1,15 +1,29 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import AsyncIterator, Optional, List, Dict, Any, Set, Tuple
 import asyncio
+import json
 import logging
+import os
 import time
-from functools import lru_cache
+from functools import partial
 
 # Import Agno-related components
 from agno.agent import Agent
 from agno.models.google import Gemini
 from app.agno_manager.knowledge_base import knowledge_base
+from app.semantic_cache import semantic_cache
+from app.agent_pool import AgentPool, shared_gemini_client
+from app.cache_dependencies import cache_dependencies, referenced_section_ids
+from app.conversation_summary import ConversationSummarizer
+from app.hedging import llm_hedger
+from app.llm_scheduler import LLMSchedulerBusy, llm_scheduler
+from app.model_router import ROUTER_FALLBACK_TIMEOUT, model_router
+from app.prompt_budget import PromptPlan, prompt_budget
+from app.response_cache import ResponseCache
+from app.session_store import create_session_store
+from app.shared_state import SharedDict, stable_digest
 from agno.tools.googlesearch import GoogleSearchTools
 
 # Configure logging
@@ -43,39 +57,59 @@ class ErrorResponse(BaseModel):
     error: str
     code: int = 500
 
-# Session storage for conversation continuity
-conversation_sessions: Dict[str, List[Message]] = {}
+# Session storage for conversation continuity (bounded history, idle expiry)
+conversation_sessions = create_session_store()
 
-# Response cache with TTL for common questions
-response_cache = {}
+# Rolling summaries of older turns keep the history part of the prompt small
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-2.0-flash")
+conversation_summarizer = ConversationSummarizer(
+    model=Gemini(id=SUMMARY_MODEL, api_key=API_KEY, temperature=0.0),
+)
+
+# Bounded response cache with TTL for common questions, shared by all workers
 CACHE_TTL = 3600  # 1 hour in seconds
+response_cache = ResponseCache("chat", ttl=CACHE_TTL, shared=SharedDict("chat_cache", ttl=CACHE_TTL))
 
-# Agno agent singleton
-agno_agent = None
+AGENT_ROLE = "You are an AI Enrollment Counselor for Illinois Institute of Technology. Your role is to provide accurate, helpful information about admissions, programs, tuition, and student life at Illinois Tech."
+AGENT_INSTRUCTIONS = [
+    "If you cannot find the answer in the knowledge base, search the web (https://www.iit.edu/) for relevant information.",
+]
 
-@lru_cache(maxsize=1)
-def get_agno_agent():
-    """Get or create the Agno agent (singleton pattern with caching)"""
-    global agno_agent
-    if agno_agent is None:
-        logger.info("Initializing Agno agent")
-        start_time = time.time()
-        agno_agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash-preview-04-17", 
-                api_key=API_KEY,
-                temperature=0.2,  # Lower temperature for more deterministic responses
-            ),
-            role="You are an AI Enrollment Counselor for Illinois Institute of Technology. Your role is to provide accurate, helpful information about admissions, programs, tuition, and student life at Illinois Tech.",
-            instructions=[
-                "If you cannot find the answer in the knowledge base, search the web (https://www.iit.edu/) for relevant information.",
-            ],
-            knowledge=knowledge_base,
-            tools=[GoogleSearchTools()],
-            search_knowledge=True,
-        )
-        logger.info(f"Agno agent initialized in {time.time() - start_time:.2f} seconds")
-    return agno_agent
+# Model for each routing tier; the usual chat model is the standard tier
+CHAT_MODELS = model_router.register("chat", "gemini-2.5-flash-preview-04-17")
+
+def _build_agno_agent(model_id: str, stream: bool = False) -> Agent:
+    """Create an enrollment counselor agent backed by the knowledge base"""
+    start_time = time.time()
+    agent = Agent(
+        model=Gemini(
+            id=model_id, 
+            api_key=API_KEY,
+            temperature=0.2,  # Lower temperature for more deterministic responses
+            client=shared_gemini_client(API_KEY),
+        ),
+        role=AGENT_ROLE,
+        instructions=AGENT_INSTRUCTIONS,
+        knowledge=knowledge_base,
+        tools=[GoogleSearchTools()],
+        search_knowledge=True,
+        stream=stream,
+    )
+    logger.info(f"Agno agent initialized in {time.time() - start_time:.2f} seconds")
+    return agent
+
+# Concurrent requests each check out their own agent; they share the knowledge base and HTTP client.
+# One pool per model tier.
+agent_pools = {
+    tier: AgentPool(f"chat_{tier}", partial(_build_agno_agent, model_id))
+    for tier, model_id in CHAT_MODELS.items()
+}
+# Agno leaves `stream` switched on for an agent once a streamed run starts, so
+# streamed responses use agents of their own
+streaming_agent_pools = {
+    tier: AgentPool(f"chat_stream_{tier}", partial(_build_agno_agent, model_id, stream=True))
+    for tier, model_id in CHAT_MODELS.items()
+}
 
 def add_chat_endpoint(app: FastAPI):
     """Add optimized chat endpoint to the FastAPI app"""
@@ -87,18 +121,19 @@ def add_chat_endpoint(app: FastAPI):
         
         # Create or retrieve conversation session
         session_id = request.session_id or f"session_{request.user_id}_{int(time.time())}"
-        if session_id not in conversation_sessions:
-            conversation_sessions[session_id] = []
         
         # Add user message to conversation history
-        conversation_sessions[session_id].append(Message(role="user", content=request.message))
+        await _append_to_session(session_id, "user", request.message)
         
         # Check cache for common questions
         cache_key = _generate_cache_key(request.message)
-        cached_response = _check_cache(cache_key)
+        cached_response = await _check_cache(cache_key)
+        if not cached_response and _is_cacheable(request.message):
+            # Fall back to a paraphrase match, e.g. "can I get my deposit refunded?"
+            cached_response = await semantic_cache.aget(request.message, namespace="chat")
         if cached_response:
             logger.info("Using cached response")
-            conversation_sessions[session_id].append(Message(role="assistant", content=cached_response))
+            await _append_to_session(session_id, "assistant", cached_response)
             
             # Generate suggested follow-up questions
             suggested_questions = _generate_suggested_questions(request.message, cached_response)
@@ -111,29 +146,35 @@ def add_chat_endpoint(app: FastAPI):
             )
         
         try:
-            # Get conversation context from last 5 messages
-            conversation_context = ""
-            history_to_use = request.conversation_history or conversation_sessions[session_id]
-            if history_to_use:
-                for msg in history_to_use[-5:]:
-                    conversation_context += f"{msg.role}: {msg.content}\n"
+            # Get conversation context (summary of older turns + recent messages)
+            conversation_context = await asyncio.to_thread(_build_conversation_context, request, session_id)
             
-            # Process the query with the agent
-            response = await _generate_chat_response(request.message, conversation_context)
+            async def generate() -> str:
+                # Process the query with the agent
+                response, section_ids, answered = await _generate_chat_response(request.message, conversation_context)
+                
+                # Cache the response if it's not too specific
+                # (avoid caching responses with user-specific details); an apology is never cached
+                if answered and _is_cacheable(request.message):
+                    await _add_to_cache(cache_key, response, section_ids)
+                    background_tasks.add_task(semantic_cache.aset, request.message, response, "chat", section_ids)
+                return response
             
-            # Add assistant response to conversation history
-            conversation_sessions[session_id].append(Message(role="assistant", content=response))
+            if _is_cacheable(request.message):
+                # Identical questions arriving together share one agent run
+                response = await response_cache.single_flight(cache_key, generate)
+            else:
+                response = await generate()
             
-            # Cache the response if it's not too specific
-            # (avoid caching responses with user-specific details)
-            if len(request.message.split()) < 15 and not any(term in request.message.lower() for term in ["my", "i have", "i am", "i will", "me", "my name"]):
-                _add_to_cache(cache_key, response)
+            # Add assistant response to conversation history
+            await _append_to_session(session_id, "assistant", response)
             
             # Generate suggested follow-up questions
             suggested_questions = _generate_suggested_questions(request.message, response)
             
-            # Clean up old sessions in the background
+            # Clean up old sessions and update the conversation summary in the background
             background_tasks.add_task(_cleanup_old_sessions)
+            background_tasks.add_task(_summarize_session, session_id)
             
             # Return the response
             return ChatResponse(
@@ -143,58 +184,160 @@ def add_chat_endpoint(app: FastAPI):
                 suggested_questions=suggested_questions
             )
             
+        except LLMSchedulerBusy as e:
+            logger.warning(f"Rejected chat request: {str(e)}")
+            raise _busy_error(e)
         except Exception as e:
             logger.error(f"Error processing chat request: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error processing chat request: {str(e)}")
     
+    @app.post("/api/chat/stream")
+    async def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks):
+        """Stream the answer as Server-Sent Events while the agent generates it.
+
+        Emits `token` events with text deltas, then one `done` event carrying the
+        session ID, processing time and suggested questions (or an `error` event).
+        """
+        start_time = time.time()
+        logger.info(f"Received streaming chat request from user {request.user_id}")
+        
+        session_id = request.session_id or f"session_{request.user_id}_{int(time.time())}"
+        await _append_to_session(session_id, "user", request.message)
+        
+        cache_key = _generate_cache_key(request.message)
+        cached_response = await _check_cache(cache_key)
+        if not cached_response and _is_cacheable(request.message):
+            cached_response = await semantic_cache.aget(request.message, namespace="chat")
+        if not cached_response:
+            # Turn the request away now if the chat queue is full, before any events are sent
+            try:
+                llm_scheduler.admit("chat")
+            except LLMSchedulerBusy as e:
+                logger.warning(f"Rejected streaming chat request: {str(e)}")
+                raise _busy_error(e)
+        conversation_context = await asyncio.to_thread(_build_conversation_context, request, session_id)
+        
+        async def event_stream() -> AsyncIterator[str]:
+            if cached_response:
+                logger.info("Using cached response")
+                response = cached_response
+                yield _sse_event("token", {"content": cached_response})
+            else:
+                chunks = []
+                section_ids: Set[str] = set()
+                try:
+                    async for token in _stream_chat_response(request.message, conversation_context, section_ids):
+                        chunks.append(token)
+                        yield _sse_event("token", {"content": token})
+                except asyncio.TimeoutError:
+                    logger.error("Response generation timed out")
+                    yield _sse_event("error", {"detail": "Response generation timed out"})
+                    return
+                except LLMSchedulerBusy as e:
+                    logger.warning(f"Rejected streaming chat request: {str(e)}")
+                    yield _sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+                    return
+                except Exception as e:
+                    logger.error(f"Error streaming chat response: {str(e)}")
+                    yield _sse_event("error", {"detail": f"Error processing chat request: {str(e)}"})
+                    return
+                response = "".join(chunks)
+                
+                if _is_cacheable(request.message):
+                    await _add_to_cache(cache_key, response, section_ids)
+                    background_tasks.add_task(semantic_cache.aset, request.message, response, "chat", section_ids)
+                background_tasks.add_task(_cleanup_old_sessions)
+            
+            await _append_to_session(session_id, "assistant", response)
+            background_tasks.add_task(_summarize_session, session_id)
+            yield _sse_event("done", {
+                "conversation_id": session_id,
+                "processing_time": time.time() - start_time,
+                "suggested_questions": _generate_suggested_questions(request.message, response),
+            })
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            # Stop proxies from buffering the stream into one late response
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=background_tasks,
+        )
+    
     @app.get("/api/chat/history/{session_id}")
     async def get_chat_history(session_id: str):
         """Get the conversation history for a session"""
-        if session_id not in conversation_sessions:
+        conversation = await asyncio.to_thread(conversation_sessions.history, session_id)
+        if conversation is None:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        return {"conversation": conversation_sessions[session_id]}
+        return {"conversation": conversation}
     
     @app.delete("/api/chat/history/{session_id}")
     async def clear_chat_history(session_id: str):
         """Clear the conversation history for a session"""
-        if session_id in conversation_sessions:
-            del conversation_sessions[session_id]
+        await asyncio.to_thread(conversation_sessions.delete, session_id)
+        await asyncio.to_thread(conversation_summarizer.forget, session_id)
         
         return {"status": "success", "message": "Conversation history cleared"}
 
 # Helper functions
+def _build_conversation_context(request: ChatRequest, session_id: str) -> str:
+    """Format the conversation for the prompt: rolling summary plus recent turns within budget"""
+    records = conversation_sessions.records(session_id) or [
+        (msg.role, msg.content, 0.0) for msg in request.conversation_history or []
+    ]
+    # The message being answered is already in the prompt as the inquiry
+    if records and records[-1][0] == "user" and records[-1][1] == request.message:
+        records = records[:-1]
+    return conversation_summarizer.build_context(session_id, records)
+
+async def _summarize_session(session_id: str) -> None:
+    """Fold older turns of a session into its rolling summary"""
+    records = await asyncio.to_thread(conversation_sessions.records, session_id)
+    await conversation_summarizer.summarize(session_id, records)
+
+async def _append_to_session(session_id: str, role: str, content: str) -> None:
+    """Append a message to the conversation history"""
+    await asyncio.to_thread(conversation_sessions.append, session_id, role, content)
+
+def _busy_error(error: LLMSchedulerBusy) -> HTTPException:
+    """429 telling the client when to retry"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def _generate_cache_key(message: str) -> str:
     """Generate a cache key for a message"""
     # Normalize the message by removing extra spaces and lowercasing
-    normalized = " ".join(message.lower().split())
-    return f"chat_{hash(normalized)}"
+    # stable_digest normalizes and, unlike hash(), matches across worker processes
+    return f"chat_{stable_digest(message)}"
+
+def _is_cacheable(message: str) -> bool:
+    """Only short, general questions are shared; anything user-specific is not"""
+    return len(message.split()) < 15 and not any(term in message.lower() for term in ["my", "i have", "i am", "i will", "me", "my name"])
 
-def _check_cache(key: str) -> Optional[str]:
+async def _check_cache(key: str) -> Optional[str]:
     """Check if a response is in the cache and not expired"""
-    if key in response_cache:
-        timestamp, response = response_cache[key]
-        if time.time() - timestamp < CACHE_TTL:
-            return response
-        else:
-            # Remove expired cache entry
-            del response_cache[key]
-    return None
-
-def _add_to_cache(key: str, response: str):
-    """Add a response to the cache with current timestamp"""
-    response_cache[key] = (time.time(), response)
-
-async def _generate_chat_response(message: str, conversation_context: str = "") -> str:
-    """Generate a response to a chat message using Agno agent with knowledge base"""
-    try:
-        # Get the agent - already initialized
-        agent = get_agno_agent()
-        
-        # Construct the prompt with conversation context
-        prompt = f"""You are an AI Enrollment Counselor for Illinois Institute of Technology.
+    return await response_cache.aget(key)
+
+async def _add_to_cache(key: str, response: str, section_ids: Set[str] = frozenset()):
+    """Add a response to the cache (expires after CACHE_TTL)"""
+    await response_cache.aset(key, response)
+    # Remember which knowledge sections the answer came from
+    await asyncio.to_thread(cache_dependencies.record, "chat", key, section_ids)
+
+cache_dependencies.register("chat", response_cache.evict, response_cache.evict_local)
+
+CHAT_PROMPT_TEMPLATE = """You are an AI Enrollment Counselor for Illinois Institute of Technology.
         
-        {f'Previous conversation:\n{conversation_context}\n' if conversation_context else ''}
+        {context}
         
         Search the knowledge base to provide accurate information about the following inquiry:
         {message}
@@ -209,21 +352,115 @@ async def _generate_chat_response(message: str, conversation_context: str = "")
         7. If the user asks for a specific document or form, provide a link to the relevant page on the website.
         8. Always include sources for the information provided only exceptions for knwoledge based answers.
         """
+
+# Fixed text of every chat prompt: the agent's role and instructions plus the guideline block
+CHAT_INSTRUCTIONS = "\n".join([
+    AGENT_ROLE,
+    *AGENT_INSTRUCTIONS,
+    CHAT_PROMPT_TEMPLATE.format(context="", message=""),
+])
+
+def _plan_chat_prompt(message: str, conversation_context: str = "") -> PromptPlan:
+    """Allocate the prompt's token budget between the message, history and retrieved knowledge"""
+    return prompt_budget.plan("chat", CHAT_INSTRUCTIONS, message, conversation_context)
+
+def _build_chat_prompt(plan: PromptPlan) -> str:
+    """Build the counselor prompt from the budgeted message and conversation context"""
+    context = f"Previous conversation:\n{plan.history}\n" if plan.history else ""
+    return CHAT_PROMPT_TEMPLATE.format(context=context, message=plan.question)
+
+async def _generate_chat_response(message: str, conversation_context: str = "") -> Tuple[str, Set[str], bool]:
+    """Generate a response to a chat message using Agno agent with knowledge base.
+
+    Returns the response text, the knowledge section IDs it was built from and
+    whether it is an answer; on timeout or error the text is an apology that
+    must not be cached.
+    """
+    async def attempt(tier: str, timeout: float):
+        async def call(started):
+            # Construct the prompt with conversation context, within the token budget
+            plan = _plan_chat_prompt(message, conversation_context)
+            
+            # Set a timeout for the agent run to prevent hanging; queueing for a slot is bounded separately
+            async with llm_scheduler.slot("chat"), agent_pools[tier].checkout() as agent:
+                started()
+                with prompt_budget.track(plan):
+                    return await asyncio.wait_for(agent.arun(_build_chat_prompt(plan)), timeout=timeout)
         
-        # Set a timeout for the agent run to prevent hanging
-        result = await asyncio.wait_for(
-            agent.arun(prompt),
-            timeout=15  # 15 second timeout
-        )
+        # When enabled, a model call slower than usual is raced against a duplicate, unless
+        # other chat requests are queued for the slot the duplicate would take
+        return await llm_hedger.run(f"chat:{tier}", call, can_hedge=lambda: not llm_scheduler.queued("chat"))
+    
+    try:
+        decision = await model_router.route("chat", message)
+        # A slow primary model is retried once on the fast model
+        result = await model_router.run(decision, attempt, timeout=15)  # 15 second timeout
         
-        return result.content
+        return result.content, referenced_section_ids(result), True
     
+    except LLMSchedulerBusy:
+        raise
     except asyncio.TimeoutError:
         logger.error("Response generation timed out")
-        return "I apologize, but I'm unable to generate a response at this time due to high processing load. Please try again with a more specific question."
+        return "I apologize, but I'm unable to generate a response at this time due to high processing load. Please try again with a more specific question.", set(), False
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
-        return "I apologize, but I encountered an error while generating a response. Please try again or rephrase your question."
+        return "I apologize, but I encountered an error while generating a response. Please try again or rephrase your question.", set(), False
+
+async def _stream_chat_response(
+    message: str, conversation_context: str = "", section_ids: Optional[Set[str]] = None
+) -> AsyncIterator[str]:
+    """Yield the response text in chunks as the Agno agent produces them.
+
+    Each chunk must arrive within the 15 second timeout. If the first one does
+    not, the answer is streamed from the fast fallback model instead. If
+    section_ids is given, it is filled with the knowledge section IDs the
+    response used.
+    """
+    decision = await model_router.route("chat", message)
+    fallback = None
+    emitted = False
+    try:
+        try:
+            async for token in _stream_from_tier(decision.tier, message, conversation_context, 15, section_ids):
+                emitted = True
+                yield token
+        except asyncio.TimeoutError:
+            # Once text has been sent the answer cannot be swapped for another model's
+            if emitted or model_router.fallback_tier(decision) is None:
+                raise
+            fallback = model_router.fallback_tier(decision)
+            logger.warning(f"chat stream on {decision.model} sent nothing within 15s, falling back")
+            async for token in _stream_from_tier(
+                fallback, message, conversation_context, ROUTER_FALLBACK_TIMEOUT, section_ids
+            ):
+                yield token
+    except BaseException as e:
+        model_router.record(decision, "timeout" if isinstance(e, asyncio.TimeoutError) else "error", fallback)
+        raise
+    model_router.record(decision, "ok", fallback)
+
+async def _stream_from_tier(
+    tier: str, message: str, conversation_context: str, timeout: float, section_ids: Optional[Set[str]]
+) -> AsyncIterator[str]:
+    """Stream one agent run on the given model tier, with a per-chunk timeout"""
+    plan = _plan_chat_prompt(message, conversation_context)
+    async with llm_scheduler.slot("chat"), streaming_agent_pools[tier].checkout() as agent:
+        with prompt_budget.track(plan):
+            stream = await agent.arun(_build_chat_prompt(plan), stream=True)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.content:
+                        yield chunk.content
+            finally:
+                # Stop the run if we timed out or the client disconnected
+                await stream.aclose()
+        if section_ids is not None:
+            section_ids.update(referenced_section_ids(agent.run_response))
 
 def _generate_suggested_questions(user_message: str, ai_response: str) -> List[str]:
     """Generate suggested follow-up questions based on the conversation"""
@@ -260,12 +497,6 @@ def _generate_suggested_questions(user_message: str, ai_response: str) -> List[s
     return suggestions[:3]
 
 async def _cleanup_old_sessions():
-    """Clean up conversation sessions older than 24 hours"""
-    # Implementation depends on how you track session creation time
-    # For now, we'll just ensure the dictionary doesn't grow too large
-    MAX_SESSIONS = 1000
-    if len(conversation_sessions) > MAX_SESSIONS:
-        # Remove oldest sessions (would need timestamp tracking for proper implementation)
-        oldest_keys = list(conversation_sessions.keys())[:len(conversation_sessions) - MAX_SESSIONS]
-        for key in oldest_keys:
-            del conversation_sessions[key]
\ No newline at end of file
+    """Clean up conversation sessions idle for longer than SESSION_IDLE_TTL"""
+    # Only touches sessions that are due, so running it after every request is cheap
+    await asyncio.to_thread(conversation_sessions.purge_expired)
@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+import json
+import logging
+import os
+
+from agno.document.base import Document
+
+from app.token_budget import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Total tokens a prompt may use: instructions + question + history + retrieved knowledge
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+# Longest question (e.g. a pasted email) kept verbatim
+PROMPT_QUESTION_TOKENS = int(os.getenv("PROMPT_QUESTION_TOKENS", "1000"))
+# Share of the tokens left after instructions and question that history may take;
+# the rest, plus whatever history does not use, goes to retrieved knowledge
+PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.3"))
+# Retrieved knowledge always gets at least this much, even if instructions are long
+MIN_RETRIEVAL_TOKENS = 500
+
+
+class PromptPlan:
+    """Token allocation and usage for one prompt"""
+
+    def __init__(self, label: str, budget: int):
+        self.label = label
+        self.budget = budget
+        self.question = ""
+        self.history = ""
+        self.tokens = {"instructions": 0, "question": 0, "history": 0, "retrieved": 0}
+        self.trimmed = {"question": 0, "history": 0}
+        self.retrieval_budget = 0
+        self.chunks_kept = 0
+        self.chunks_dropped = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.tokens.values())
+
+    def log(self) -> None:
+        parts = []
+        for name, count in self.tokens.items():
+            trimmed = self.trimmed.get(name)
+            parts.append(f"{name}={count}" + (f" (-{trimmed})" if trimmed else ""))
+        logger.info(
+            f"Prompt tokens [{self.label}]: {' '.join(parts)}, "
+            f"{self.chunks_kept} chunks kept, {self.chunks_dropped} dropped, total={self.total}/{self.budget}"
+        )
+
+
+# Plan of the request currently being answered; copied into the tasks the agent
+# spawns for tool calls, so knowledge searches see their own request's budget
+_current_plan: ContextVar[Optional[PromptPlan]] = ContextVar("prompt_plan", default=None)
+
+
+def _score(doc: Document) -> float:
+    """Best available relevance score: reranker, then fused rank, then similarity"""
+    if doc.reranking_score is not None:
+        return doc.reranking_score
+    meta_data = doc.meta_data or {}
+    for key in ("rrf_score", "score"):
+        if meta_data.get(key) is not None:
+            return meta_data[key]
+    return float("-inf")
+
+
+class PromptBudget:
+    """Allocates a prompt's token budget across its components.
+
+    Instructions are ours and never cut. The question is capped, history
+    gets a share of what remains (keeping its newest part) and retrieved
+    knowledge gets the rest. Knowledge chunks are packed highest score first,
+    so the same search always yields the same prompt.
+    """
+
+    def __init__(
+        self,
+        total: int = PROMPT_TOKEN_BUDGET,
+        question_tokens: int = PROMPT_QUESTION_TOKENS,
+        history_share: float = PROMPT_HISTORY_SHARE,
+    ):
+        self.total = total
+        self.question_tokens = question_tokens
+        self.history_share = history_share
+
+    def plan(self, label: str, instructions: str, question: str, history: str = "") -> PromptPlan:
+        """Trim question and history to their allocations and reserve the rest for retrieval"""
+        plan = PromptPlan(label, self.total)
+        plan.tokens["instructions"] = estimate_tokens(instructions)
+
+        question_tokens = estimate_tokens(question)
+        plan.question = truncate_to_tokens(question, self.question_tokens)
+        plan.tokens["question"] = estimate_tokens(plan.question)
+        plan.trimmed["question"] = max(question_tokens - plan.tokens["question"], 0)
+
+        remaining = max(self.total - plan.tokens["instructions"] - plan.tokens["question"], 0)
+        history_tokens = estimate_tokens(history)
+        # History never eats into the retrieval floor
+        history_budget = min(int(remaining * self.history_share), max(remaining - MIN_RETRIEVAL_TOKENS, 0))
+        plan.history = truncate_to_tokens(history, history_budget, keep_end=True)
+        plan.tokens["history"] = estimate_tokens(plan.history)
+        plan.trimmed["history"] = max(history_tokens - plan.tokens["history"], 0)
+
+        plan.retrieval_budget = max(remaining - plan.tokens["history"], MIN_RETRIEVAL_TOKENS)
+        return plan
+
+    @contextmanager
+    def track(self, plan: PromptPlan) -> Iterator[PromptPlan]:
+        """Apply the plan to knowledge searches made inside the block, then log it"""
+        previous = _current_plan.get()
+        _current_plan.set(plan)
+        try:
+            yield plan
+        finally:
+            # set() rather than reset(): streamed runs may exit from another context
+            _current_plan.set(previous)
+            plan.log()
+
+
+def fit_retrieved(documents: List[Document]) -> List[Document]:
+    """Keep the highest-scoring documents that fit the current request's retrieval budget"""
+    plan = _current_plan.get()
+    if plan is None:
+        return documents
+    # Ties keep the search order, so trimming is deterministic
+    ranked = sorted(enumerate(documents), key=lambda item: (-_score(item[1]), item[0]))
+    kept = []
+    for _, doc in ranked:
+        # The agent hands documents to the model as JSON
+        cost = estimate_tokens(json.dumps(doc.to_dict()))
+        if plan.tokens["retrieved"] + cost > plan.retrieval_budget:
+            plan.chunks_dropped += 1
+            continue
+        kept.append(doc)
+        plan.tokens["retrieved"] += cost
+        plan.chunks_kept += 1
+    return kept
+
+
+prompt_budget = PromptBudget()
@@ -0,0 +1,189 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from app.cache_dependencies import cache_dependencies
+from app.shared_state import SharedDict
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))  # 16 MB
+RESPONSE_CACHE_SWEEP_INTERVAL = float(os.getenv("RESPONSE_CACHE_SWEEP_INTERVAL", "60"))  # seconds
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    return len(json.dumps(value).encode())
+
+
+class ResponseCache:
+    """Bounded LRU + TTL cache for generated answers.
+
+    Entries live in an in-process LRU capped by entry count and total bytes,
+    and are written through to a shared namespace so other workers can reuse
+    them. A background sweep drops expired entries. single_flight() makes
+    concurrent identical requests share one generation instead of each
+    calling the model.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        shared: Optional[SharedDict] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _remove(self, key: str) -> None:
+        """Drop a local entry (caller holds the lock)"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _insert(self, key: str, value: Any, expires_at: float) -> None:
+        """Add a local entry and evict least recently used ones (caller holds the lock)"""
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            # Still in the shared cache, so its dependency tracking stays
+            self._remove(next(iter(self._entries)))
+
+    def get(self, key: str) -> Optional[Any]:
+        # Drop local copies other workers invalidated before trusting them
+        cache_dependencies.poll()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+
+        entry = self.shared.get_entry(key) if self.shared is not None else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            # Filled by another worker; the local copy expires with the shared entry, not later,
+            # and is dropped with it when another worker's invalidation is polled
+            value, expires_at = entry
+            self._insert(key, value, min(expires_at or now + self.ttl, now + self.ttl))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._insert(key, value, time.time() + self.ttl)
+        if self.shared is not None:
+            self.shared[key] = value
+
+    async def aget(self, key: str) -> Optional[Any]:
+        # A local miss reads the shared backend, which may wait on another worker's lock
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def evict(self, key: str) -> None:
+        self.evict_local(key)
+        if self.shared is not None:
+            self.shared.pop(key)
+
+    def evict_local(self, key: str) -> None:
+        """Drop only this worker's copy (the shared entry was already removed)"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.shared is not None:
+            self.shared.clear()
+
+    async def single_flight(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Run compute() once for all concurrent callers with the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        else:
+            self.coalesced += 1
+            logger.info(f"Waiting for in-flight {self.name} response instead of generating it again")
+        # Shielded so one caller disconnecting does not cancel the others' answer
+        return await asyncio.shield(task)
+
+    def sweep(self) -> int:
+        """Drop expired entries"""
+        # Idle workers still apply other workers' invalidations between requests
+        cache_dependencies.poll()
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+        for key in expired:
+            cache_dependencies.forget(self.name, key)
+        if self.shared is not None:
+            self.shared.backend.purge_expired()
+        return len(expired)
+
+    async def _sweep_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Error sweeping {self.name} cache: {str(e)}")
+
+    def start_sweeper(self, interval: float = RESPONSE_CACHE_SWEEP_INTERVAL) -> None:
+        """Start the background sweep on the running event loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+
+    def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
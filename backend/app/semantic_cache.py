@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.agno_manager.knowledge_base import embedder as knowledge_embedder
+from app.cache_dependencies import cache_dependencies
+
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity for two questions to share an answer
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # 1 hour in seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    namespace: str
+    question: str
+    answer: str
+    created_at: float
+    expires_at: float
+    hits: int = 0
+    last_hit_at: Optional[float] = None
+    last_used_at: float = field(default_factory=time.time)
+
+
+class SemanticCache:
+    """Answer cache that matches new questions to stored ones by embedding similarity.
+
+    Question embeddings are kept as rows of a normalized float32 matrix, so a
+    lookup is one matrix-vector product. Entries expire after a TTL and the
+    least recently used entry is evicted once the cache is full.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: List[CacheEntry] = []
+        self._matrix = np.zeros((0, embedder.dimensions or 0), dtype=np.float32)
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            embedding = self.embedder.get_embedding(" ".join(question.lower().split()))
+        except Exception as e:
+            # A cache must never fail the request it is trying to speed up
+            logger.warning(f"Semantic cache embedding failed: {str(e)}")
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not vector.size or norm == 0:
+            return None
+        return vector / norm
+
+    def _drop(self, positions: List[int]) -> None:
+        """Remove entries by position (caller holds the lock)"""
+        if not positions:
+            return
+        doomed = set(positions)
+        for i in doomed:
+            cache_dependencies.forget("semantic", self._entries[i].key)
+        keep = [i for i in range(len(self._entries)) if i not in doomed]
+        self._entries = [self._entries[i] for i in keep]
+        self._matrix = self._matrix[keep]
+
+    def _expire(self, now: float) -> None:
+        """Drop every expired entry (caller holds the lock)"""
+        self._drop([i for i, entry in enumerate(self._entries) if entry.expires_at <= now])
+
+    def get(self, question: str, namespace: str = "default", threshold: Optional[float] = None) -> Optional[str]:
+        """Return a stored answer for a sufficiently similar question, if any"""
+        threshold = threshold or self.threshold
+        cache_dependencies.poll()
+        vector = self._embed(question)
+        if vector is None:
+            return None
+
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if self._entries:
+                scores = self._matrix @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < threshold:
+                        break
+                    entry = self._entries[i]
+                    if entry.namespace != namespace:
+                        continue
+                    entry.hits += 1
+                    entry.last_hit_at = now
+                    entry.last_used_at = now
+                    self.hits += 1
+                    logger.info(f"Semantic cache hit ({scores[i]:.3f}) for: {entry.question[:80]}")
+                    return entry.answer
+            self.misses += 1
+        return None
+
+    def set(
+        self,
+        question: str,
+        answer: str,
+        namespace: str = "default",
+        sections: Iterable[str] = (),
+        threshold: Optional[float] = None,
+    ) -> None:
+        """Store an answer for a question, tagged with the knowledge sections it used.
+
+        threshold should be the one get() uses for the namespace: a stored
+        question closer than that is replaced, since lookups could not tell
+        the two apart.
+        """
+        threshold = threshold or self.threshold
+        vector = self._embed(question)
+        if vector is None:
+            return
+
+        now = time.time()
+        key = blake2b(f"{namespace}:{question}".encode(), digest_size=16).hexdigest()
+        entry = CacheEntry(
+            key=key,
+            namespace=namespace,
+            question=question,
+            answer=answer,
+            created_at=now,
+            expires_at=now + self.ttl,
+        )
+        with self._lock:
+            self._expire(now)
+            # Replace a near-identical question instead of storing it twice
+            if self._entries:
+                scores = self._matrix @ vector
+                duplicates = [
+                    i for i in np.flatnonzero(scores >= threshold)
+                    if self._entries[i].namespace == namespace
+                ]
+                self._drop(duplicates)
+            # Evict least recently used entries to stay within the size limit
+            overflow = len(self._entries) - self.max_entries + 1
+            if overflow > 0:
+                by_age = sorted(range(len(self._entries)), key=lambda i: self._entries[i].last_used_at)
+                self._drop(by_age[:overflow])
+            self._entries.append(entry)
+            self._matrix = np.vstack([self._matrix, vector[None, :]])
+        cache_dependencies.record("semantic", key, sections)
+
+    def evict(self, key: str) -> None:
+        """Remove one entry by key"""
+        with self._lock:
+            self._drop([i for i, entry in enumerate(self._entries) if entry.key == key])
+
+    async def aget(
+        self, question: str, namespace: str = "default", threshold: Optional[float] = None
+    ) -> Optional[str]:
+        # Embedding the question may need a network call
+        return await asyncio.to_thread(self.get, question, namespace, threshold)
+
+    async def aset(
+        self,
+        question: str,
+        answer: str,
+        namespace: str = "default",
+        sections: Iterable[str] = (),
+        threshold: Optional[float] = None,
+    ) -> None:
+        await asyncio.to_thread(self.set, question, answer, namespace, sections, threshold)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._matrix = self._matrix[:0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Overall and per-entry hit statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "threshold": self.threshold,
+                "top_entries": [
+                    {
+                        "namespace": entry.namespace,
+                        "question": entry.question,
+                        "hits": entry.hits,
+                        "age_seconds": round(time.time() - entry.created_at, 1),
+                        "last_hit_at": entry.last_hit_at,
+                    }
+                    for entry in sorted(self._entries, key=lambda e: e.hits, reverse=True)[:20]
+                ],
+            }
+
+
+# Used by /api/chat only: emails are personalized, so drafts are never reused for a merely similar email
+semantic_cache = SemanticCache(embedder=knowledge_embedder)
+cache_dependencies.register("semantic", semantic_cache.evict)
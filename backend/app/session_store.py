@@ -0,0 +1,178 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import heapq
+import logging
+import os
+import threading
+import time
+
+from app.shared_state import InProcessBackend, SharedDict, state_backend
+
+logger = logging.getLogger(__name__)
+
+# Sessions idle for longer than this are dropped
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(24 * 3600)))  # 24 hours in seconds
+# Messages kept per session; older ones fall off the front of the ring buffer
+SESSION_HISTORY_SIZE = int(os.getenv("SESSION_HISTORY_SIZE", "20"))
+# Hard cap on live sessions per process; the least recently used go first
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+# Compact history record: (role, content, timestamp)
+Record = Tuple[str, str, float]
+
+
+def _as_record(record) -> Record:
+    if isinstance(record, dict):
+        # Stored before history records were compacted
+        return (record["role"], record["content"], 0.0)
+    return tuple(record)
+
+
+def _as_message(record) -> Dict[str, str]:
+    role, content, _ = _as_record(record)
+    return {"role": role, "content": content}
+
+
+class SessionStore:
+    """In-process conversation sessions with idle-TTL eviction.
+
+    History is a fixed-size ring buffer of (role, content, timestamp)
+    tuples, so memory per session is bounded. Expiry deadlines sit in a
+    min-heap; an access only updates last_access, and a stale heap entry is
+    re-pushed when it reaches the top. Cleanup therefore touches only
+    sessions that are due, not every session.
+    """
+
+    class _Session:
+        __slots__ = ("history", "last_access")
+
+        def __init__(self, history_size: int, now: float):
+            self.history: Deque[Record] = deque(maxlen=history_size)
+            self.last_access = now
+
+    def __init__(
+        self,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        history_size: int = SESSION_HISTORY_SIZE,
+        max_sessions: int = SESSION_MAX_COUNT,
+    ):
+        self.idle_ttl = idle_ttl
+        self.history_size = history_size
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, SessionStore._Session] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+
+    def _pop_due(self, now: Optional[float]) -> int:
+        """Evict sessions whose deadline has passed, or the least recently used one
+        when now is None (caller holds the lock)"""
+        evicted = 0
+        while self._deadlines:
+            deadline, session_id = self._deadlines[0]
+            if now is not None and deadline > now:
+                break
+            heapq.heappop(self._deadlines)
+            session = self._sessions.get(session_id)
+            if session is None:
+                continue
+            actual = session.last_access + self.idle_ttl
+            if actual > deadline:
+                # Accessed since this entry was pushed; reschedule it
+                heapq.heappush(self._deadlines, (actual, session_id))
+                continue
+            del self._sessions[session_id]
+            evicted += 1
+            if now is None:
+                break
+        return evicted
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._pop_due(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._pop_due(None)
+                session = self._Session(self.history_size, now)
+                self._sessions[session_id] = session
+                heapq.heappush(self._deadlines, (now + self.idle_ttl, session_id))
+            session.last_access = now
+            session.history.append((role, content, now))
+
+    def history(self, session_id: str) -> Optional[List[Dict[str, str]]]:
+        """Messages of a session, oldest first, or None if it does not exist"""
+        now = time.time()
+        with self._lock:
+            self._pop_due(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_access = now
+            return [_as_message(record) for record in session.history]
+
+    def records(self, session_id: str) -> Optional[List[Record]]:
+        """Raw (role, content, timestamp) records, oldest first"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session.history) if session is not None else None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            # Its heap entry is skipped when it reaches the top
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._pop_due(time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "scheduled": len(self._deadlines)}
+
+
+class SharedSessionStore:
+    """Conversation sessions in the shared state backend, visible to every worker.
+
+    Each append is an atomic ring-buffer append capped at history_size that
+    also pushes the session's expiry out by idle_ttl; expired rows are purged
+    through the backend's expires_at index.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "chat_sessions",
+        idle_ttl: float = SESSION_IDLE_TTL,
+        history_size: int = SESSION_HISTORY_SIZE,
+    ):
+        self.history_size = history_size
+        self._sessions = SharedDict(namespace, ttl=idle_ttl)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        self._sessions.append(session_id, [role, content, time.time()], max_items=self.history_size)
+
+    def history(self, session_id: str) -> Optional[List[Dict[str, str]]]:
+        records = self._sessions.get(session_id)
+        if records is None:
+            return None
+        return [_as_message(record) for record in records]
+
+    def records(self, session_id: str) -> Optional[List[Record]]:
+        records = self._sessions.get(session_id)
+        return [_as_record(record) for record in records] if records is not None else None
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+
+    def purge_expired(self) -> int:
+        return self._sessions.backend.purge_expired()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions)}
+
+
+def create_session_store():
+    """Share sessions between workers unless the state backend is per-process anyway"""
+    if isinstance(state_backend, InProcessBackend):
+        return SessionStore()
+    return SharedSessionStore()
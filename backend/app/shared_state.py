@@ -0,0 +1,368 @@
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" shares caches, sessions and task status between uvicorn workers on one host,
+# "memory" keeps them per process (fine for a single worker or tests)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite").lower()
+STATE_BACKEND_PATH = os.getenv("STATE_BACKEND_PATH", "app/knowledge_data/shared_state.sqlite3")
+
+
+def stable_digest(text: str) -> str:
+    """Digest of the normalized text that is identical in every process.
+
+    Unlike hash(), which is salted per interpreter, this gives the same cache
+    key no matter which worker handles the request.
+    """
+    normalized = " ".join(text.lower().split())
+    return blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+class StateBackend(ABC):
+    """Key/value storage for JSON-serializable values, grouped by namespace"""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def get_entry(self, namespace: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Live value and its expiry time (None = never), or None"""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        """Atomically delete a key and return its live value"""
+
+    @abstractmethod
+    def update(
+        self, namespace: str, key: str, update: Callable[[Optional[Any]], Any], ttl: Optional[float] = None
+    ) -> Any:
+        """Atomically replace a value with update(current value or None) and return it"""
+
+    @abstractmethod
+    def append(
+        self, namespace: str, key: str, item: Any, ttl: Optional[float] = None, max_items: Optional[int] = None
+    ) -> List[Any]:
+        """Atomically append to a list value, keeping at most max_items"""
+
+    @abstractmethod
+    def keys(self, namespace: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Drop expired entries that nobody has read since they expired"""
+
+
+class InProcessBackend(StateBackend):
+    """Per-process backend; state is not shared between workers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Tuple[Optional[float], Any]]] = {}
+
+    def _live(self, namespace: str, key: str) -> Optional[Tuple[Optional[float], Any]]:
+        entry = self._data.get(namespace, {}).get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            del self._data[namespace][key]
+            return None
+        return entry
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(namespace, key)
+            return entry[1] if entry else None
+
+    def get_entry(self, namespace: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            entry = self._live(namespace, key)
+            return (entry[1], entry[0]) if entry else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            expires_at = time.time() + ttl if ttl else None
+            self._data.setdefault(namespace, {})[key] = (expires_at, value)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, None) is not None
+
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(namespace, key)
+            if entry is None:
+                return None
+            del self._data[namespace][key]
+            return entry[1]
+
+    def update(
+        self, namespace: str, key: str, update: Callable[[Optional[Any]], Any], ttl: Optional[float] = None
+    ) -> Any:
+        with self._lock:
+            entry = self._live(namespace, key)
+            value = update(entry[1] if entry else None)
+            expires_at = time.time() + ttl if ttl else None
+            self._data.setdefault(namespace, {})[key] = (expires_at, value)
+            return value
+
+    def append(
+        self, namespace: str, key: str, item: Any, ttl: Optional[float] = None, max_items: Optional[int] = None
+    ) -> List[Any]:
+        with self._lock:
+            entry = self._live(namespace, key)
+            items = (entry[1] if entry else []) + [item]
+            if max_items:
+                items = items[-max_items:]
+            expires_at = time.time() + ttl if ttl else None
+            self._data.setdefault(namespace, {})[key] = (expires_at, items)
+            return items
+
+    def keys(self, namespace: str) -> List[str]:
+        with self._lock:
+            return [key for key in list(self._data.get(namespace, {})) if self._live(namespace, key)]
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+            else:
+                self._data.pop(namespace, None)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            now = time.time()
+            purged = 0
+            for entries in self._data.values():
+                for key in [k for k, (expires_at, _) in entries.items() if expires_at is not None and expires_at <= now]:
+                    del entries[key]
+                    purged += 1
+            return purged
+
+
+class SQLiteBackend(StateBackend):
+    """Backend in a WAL-mode SQLite file that every worker on the host opens"""
+
+    def __init__(self, path: str = STATE_BACKEND_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)")
+
+    def _read(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._conn.execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, namespace: str, key: str, value: Any, ttl: Optional[float]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._read(namespace, key)
+
+    def get_entry(self, namespace: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM state"
+                " WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+            return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._write(namespace, key, value, ttl)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            return cursor.rowcount > 0
+
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            # BEGIN IMMEDIATE so an append from another worker lands before or after, never in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = self._read(namespace, key)
+                self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return value
+
+    def update(
+        self, namespace: str, key: str, update: Callable[[Optional[Any]], Any], ttl: Optional[float] = None
+    ) -> Any:
+        with self._lock:
+            # BEGIN IMMEDIATE so a write from another worker can't land between the read and the write
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = update(self._read(namespace, key))
+                self._write(namespace, key, value, ttl)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return value
+
+    def append(
+        self, namespace: str, key: str, item: Any, ttl: Optional[float] = None, max_items: Optional[int] = None
+    ) -> List[Any]:
+        def add(items: Optional[List[Any]]) -> List[Any]:
+            items = (items or []) + [item]
+            return items[-max_items:] if max_items else items
+
+        # Atomic, so two workers appending to one session don't lose a message
+        return self.update(namespace, key, add, ttl)
+
+    def keys(self, namespace: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time()),
+            ).fetchall()
+            return [row[0] for row in rows]
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM state")
+            else:
+                self._conn.execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+    def purge_expired(self) -> int:
+        # The expires_at index keeps this proportional to what actually expired
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )
+            return cursor.rowcount
+
+
+class SharedDict:
+    """Dict-like view of one namespace of a state backend.
+
+    The SQLite backend can wait on another worker's write lock, so coroutines
+    use the a-prefixed methods, which run the call in a worker thread.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, backend: Optional[StateBackend] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend or state_backend
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.backend.get(self.namespace, key)
+        return default if value is None else value
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Value and its expiry time, for copies that must not outlive it"""
+        return self.backend.get_entry(self.namespace, key)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.backend.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.backend.set(self.namespace, key, value, self.ttl)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.backend.get(self.namespace, key) is not None
+
+    def __len__(self) -> int:
+        return len(self.backend.keys(self.namespace))
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = self.backend.pop(self.namespace, key)
+        return default if value is None else value
+
+    def update(self, key: str, update: Callable[[Optional[Any]], Any]) -> Any:
+        """Atomically replace the value with update(current value or None)"""
+        return self.backend.update(self.namespace, key, update, self.ttl)
+
+    def update_item(self, key: str, **fields) -> None:
+        """Atomically merge fields into a stored dict value"""
+        self.update(key, lambda value: {**(value or {}), **fields})
+
+    def append(self, key: str, item: Any, max_items: Optional[int] = None) -> List[Any]:
+        return self.backend.append(self.namespace, key, item, self.ttl, max_items)
+
+    def keys(self) -> List[str]:
+        return self.backend.keys(self.namespace)
+
+    def clear(self) -> None:
+        self.backend.clear(self.namespace)
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.__setitem__, key, value)
+
+    async def aupdate(self, key: str, update: Callable[[Optional[Any]], Any]) -> Any:
+        return await asyncio.to_thread(self.update, key, update)
+
+    async def aupdate_item(self, key: str, **fields) -> None:
+        await asyncio.to_thread(self.update_item, key, **fields)
+
+
+def create_state_backend() -> StateBackend:
+    """Build the backend selected by STATE_BACKEND"""
+    if STATE_BACKEND == "memory":
+        return InProcessBackend()
+    try:
+        return SQLiteBackend(STATE_BACKEND_PATH)
+    except Exception as e:
+        # Fall back rather than refuse to start; caching just stops being shared
+        logger.error(f"Could not open shared state at {STATE_BACKEND_PATH}, using in-process state: {str(e)}")
+        return InProcessBackend()
+
+
+# Shared by main.py and the chat endpoint
+state_backend = create_state_backend()
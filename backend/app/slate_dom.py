@@ -0,0 +1,140 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urljoin
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Read emails and fill replies straight from Slate's DOM before falling back to the vision agent
+SLATE_DOM_FAST_PATH = os.getenv("SLATE_DOM_FAST_PATH", "true").lower() == "true"
+# Playwright selectors for the known Slate layouts; a comma-separated list matches any of them
+SLATE_INBOX_LINK_SELECTOR = os.getenv("SLATE_INBOX_LINK_SELECTOR", "a[href*='/manage/inbox/email/']")
+SLATE_MESSAGE_BODY_SELECTOR = os.getenv(
+    "SLATE_MESSAGE_BODY_SELECTOR", "#message_body, .message-body, .email-body, [data-role='message-body']"
+)
+SLATE_REPLY_BUTTON_SELECTOR = os.getenv(
+    "SLATE_REPLY_BUTTON_SELECTOR", "button:has-text('Reply'), a:has-text('Reply'), input[type='button'][value='Reply']"
+)
+# The reply form that opens after clicking Reply; the editor is only looked for inside it
+SLATE_REPLY_FORM_SELECTOR = os.getenv("SLATE_REPLY_FORM_SELECTOR", "form:has(textarea[name='body'])")
+# The CKEditor frame of the reply form, or its plain body textarea when CKEditor is not loaded
+SLATE_REPLY_EDITOR_SELECTOR = os.getenv(
+    "SLATE_REPLY_EDITOR_SELECTOR", "iframe.cke_wysiwyg_frame, textarea[name='body']:visible"
+)
+# How long to wait for each element before deciding the layout is not the expected one (ms)
+SLATE_DOM_TIMEOUT = int(os.getenv("SLATE_DOM_TIMEOUT", "5000"))
+
+
+class SlateLayoutError(Exception):
+    """The page did not match the expected Slate layout; use the vision agent instead"""
+
+    def __init__(self, message: str, draft: Optional[str] = None):
+        super().__init__(message)
+        # The reply already generated when only pasting it failed, so the fallback can reuse it
+        self.draft = draft
+
+
+class _FastPathStats:
+    def __init__(self):
+        self.drafted = 0
+        self.listed = 0
+        self.fallbacks: Dict[str, int] = {"draft": 0, "inbox": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": SLATE_DOM_FAST_PATH, "drafted": self.drafted, "inbox_listed": self.listed, "fallbacks": dict(self.fallbacks)}
+
+
+fast_path_stats = _FastPathStats()
+
+
+async def _open(page, url: str) -> None:
+    try:
+        await page.goto(url, wait_until="domcontentloaded")
+    except Exception as e:
+        raise SlateLayoutError(f"Could not open {url}: {str(e)}") from e
+
+
+async def list_inbox_emails(page, inbox_url: str, limit: int) -> List[str]:
+    """URLs of the first `limit` emails listed in the inbox"""
+    await _open(page, inbox_url)
+    links = page.locator(SLATE_INBOX_LINK_SELECTOR)
+    try:
+        await links.first.wait_for(timeout=SLATE_DOM_TIMEOUT)
+        hrefs = await links.evaluate_all("links => links.map(link => link.getAttribute('href'))")
+    except Exception as e:
+        raise SlateLayoutError(f"No inbox entries matched {SLATE_INBOX_LINK_SELECTOR!r}: {str(e)}") from e
+    urls: List[str] = []
+    for href in hrefs:
+        url = urljoin(page.url, href) if href else None
+        if url and url not in urls:
+            urls.append(url)
+    if not urls:
+        raise SlateLayoutError("Inbox entries had no links")
+    return urls[:limit]
+
+
+async def read_message(page, url: str) -> str:
+    """Full text of the email opened at url"""
+    await _open(page, url)
+    body = page.locator(SLATE_MESSAGE_BODY_SELECTOR).first
+    try:
+        await body.wait_for(timeout=SLATE_DOM_TIMEOUT)
+        text = (await body.inner_text()).strip()
+    except Exception as e:
+        raise SlateLayoutError(f"No message body matched {SLATE_MESSAGE_BODY_SELECTOR!r}: {str(e)}") from e
+    if not text:
+        raise SlateLayoutError("Message body is empty")
+    return text
+
+
+async def _find_editor(page):
+    """The reply editor inside the open reply form; the body of a CKEditor frame if it has one"""
+    form = page.locator(SLATE_REPLY_FORM_SELECTOR).first
+    editor = form.locator(SLATE_REPLY_EDITOR_SELECTOR).first
+    try:
+        await editor.wait_for(timeout=SLATE_DOM_TIMEOUT)
+        if await editor.evaluate("el => el.tagName") == "IFRAME":
+            editor = editor.content_frame.locator("body.cke_editable")
+            # An empty editor body has no height, so wait for it to exist rather than to show
+            await editor.wait_for(state="attached", timeout=SLATE_DOM_TIMEOUT)
+    except Exception as e:
+        raise SlateLayoutError(
+            f"No reply editor matched {SLATE_REPLY_EDITOR_SELECTOR!r} in {SLATE_REPLY_FORM_SELECTOR!r}: {str(e)}"
+        ) from e
+    return editor
+
+
+async def fill_reply(page, text: str) -> None:
+    """Click Reply and put text in the reply form's editor (the reply is never sent)"""
+    try:
+        await page.locator(SLATE_REPLY_BUTTON_SELECTOR).first.click(timeout=SLATE_DOM_TIMEOUT)
+    except Exception as e:
+        raise SlateLayoutError(f"No reply button matched {SLATE_REPLY_BUTTON_SELECTOR!r}: {str(e)}") from e
+    editor = await _find_editor(page)
+    try:
+        if await editor.evaluate("el => el.isContentEditable"):
+            # innerText keeps the draft's line breaks; the input event lets the editor pick up the change
+            await editor.evaluate(
+                "(el, text) => { el.focus(); el.innerText = text; el.dispatchEvent(new Event('input', {bubbles: true})); }",
+                text,
+            )
+        else:
+            await editor.fill(text)
+    except Exception as e:
+        raise SlateLayoutError(f"Could not fill the reply editor: {str(e)}") from e
+
+
+async def draft_reply(page, url: str, draft: Callable[[str], Awaitable[str]]) -> str:
+    """Read the email at url, generate a reply with draft(text) and paste it into the reply editor.
+
+    Raises SlateLayoutError if any step of the page does not match the known
+    layout, carrying the generated reply when only pasting it failed; errors
+    from draft() are passed through unchanged.
+    """
+    content = await read_message(page, url)
+    response = await draft(content)
+    try:
+        await fill_reply(page, response)
+    except SlateLayoutError as e:
+        raise SlateLayoutError(str(e), draft=response) from e
+    return response
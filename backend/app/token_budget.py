@@ -0,0 +1,40 @@
+import re
+
+# Words, numbers and single punctuation marks, roughly how BPE tokenizers split text
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local approximation of the model's token count.
+
+    Counts words and punctuation, charging long words one extra token per
+    six characters. Close enough to budget prompts without calling the API.
+    """
+    if not text:
+        return 0
+    count = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        length = match.end() - match.start()
+        count += 1 + (length - 1) // 6
+    return count
+
+
+def truncate_to_tokens(text: str, budget: int, keep_end: bool = False) -> str:
+    """Cut text to roughly `budget` tokens at a word boundary (deterministic)"""
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+    kept = []
+    # Leave room for the ellipsis that marks the cut
+    used = estimate_tokens("...")
+    words = text.split(" ")
+    for word in (reversed(words) if keep_end else words):
+        cost = estimate_tokens(word)
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    if keep_end:
+        return "... " + " ".join(reversed(kept))
+    return " ".join(kept) + " ..."
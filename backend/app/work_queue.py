@@ -0,0 +1,73 @@
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkItem:
+    key: str
+    status: str = "queued"
+    attempts: int = 0
+    error: Optional[str] = None
+    duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+async def run_work_queue(
+    keys: List[str],
+    handle: Callable[[str], Awaitable[Any]],
+    workers: int,
+    retries: int = 0,
+    on_update: Optional[Callable[[List[WorkItem]], Awaitable[Any]]] = None,
+) -> List[WorkItem]:
+    """Process keys with up to `workers` concurrent handle(key) calls.
+
+    Each key is its own unit of work: a failure is retried up to `retries`
+    times (after the rest of the queue has had a turn) and never stops the
+    other keys. on_update is awaited with every item whenever one changes
+    status. A handle that raises asyncio.TimeoutError is reported as "timeout".
+    """
+    items = [WorkItem(key) for key in keys]
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    async def update() -> None:
+        if on_update is not None:
+            await on_update(items)
+
+    async def worker() -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            item.status = "running"
+            item.attempts += 1
+            await update()
+            start_time = time.monotonic()
+            try:
+                await handle(item.key)
+                item.status, item.error = "completed", None
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                item.error = "timed out" if timed_out else str(e)
+                if item.attempts <= retries:
+                    logger.warning(f"{item.key} failed on attempt {item.attempts} ({item.error}), retrying")
+                    item.status = "retrying"
+                    queue.put_nowait(item)
+                else:
+                    logger.error(f"{item.key} failed after {item.attempts} attempts: {item.error}")
+                    item.status = "timeout" if timed_out else "failed"
+            finally:
+                item.duration = round(time.monotonic() - start_time, 2)
+                await update()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(items))))))
+    return items
@@ -1,19 +1,22 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.concurrency import asynccontextmanager
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import asyncio
 import os
 from dotenv import load_dotenv
 import platform
 import logging
-from functools import lru_cache
+from functools import lru_cache, partial
 import time
+from typing import Dict, List, Optional
+from uuid import uuid4
 
 # Try to import browser-use components
 try:
     from browser_use import Agent as BrowserAgent, Browser, BrowserConfig, Controller
     from langchain_google_genai import ChatGoogleGenerativeAI
+    from app.browser_contexts import new_isolated_context
     BROWSER_USE_AVAILABLE = True
 except ImportError:
     BROWSER_USE_AVAILABLE = False
@@ -21,8 +24,21 @@ except ImportError:
 # Import Agno-related components
 from agno.agent import Agent as AgnoAgent
 from agno.models.google import Gemini
-from app.agno_manager.knowledge_base import knowledge_base
-from app.optimized_chat_endpoint import add_chat_endpoint
+from app.agno_manager.knowledge_base import knowledge_base, KNOWLEDGE_SYNC_MODE
+from app.agno_manager.knowledge_sync import sync_knowledge_base
+from app.optimized_chat_endpoint import add_chat_endpoint, agent_pools as chat_agent_pools, streaming_agent_pools, response_cache as chat_response_cache
+from app.semantic_cache import semantic_cache
+from app.agent_pool import AgentPool, shared_gemini_client
+from app.browser_pool import BrowserPool
+from app.cache_dependencies import cache_dependencies, referenced_section_ids
+from app.hedging import llm_hedger
+from app.llm_scheduler import LLMSchedulerBusy, llm_scheduler
+from app.model_router import STANDARD, model_router
+from app.prompt_budget import prompt_budget
+from app.response_cache import ResponseCache
+from app.shared_state import SharedDict, stable_digest
+from app.slate_dom import SLATE_DOM_FAST_PATH, SlateLayoutError, draft_reply, fast_path_stats, list_inbox_emails
+from app.work_queue import run_work_queue
 
 # backend/main.py (modification)
 
@@ -50,11 +66,20 @@ API_KEY = os.getenv('GEMINI_API_KEY')
 async def lifespan(app: FastAPI):
     # Initialize knowledge base before serving requests
     initialize_knowledge_base()
-    # Pre-load the agent model to avoid cold start
-    _ = get_agno_agent()
+    # Pre-build agents to avoid a cold start
+    email_agent_pools[STANDARD].warm()
+    chat_agent_pools[STANDARD].warm()
+    # Launch browsers ahead of the first email task
+    if BROWSER_USE_AVAILABLE:
+        await browser_pool.start()
+    # Periodically drop expired cache entries instead of waiting for them to be read
+    response_cache.start_sweeper()
+    chat_response_cache.start_sweeper()
     yield
     # Clean up resources at shutdown
-    pass
+    response_cache.stop_sweeper()
+    chat_response_cache.stop_sweeper()
+    await browser_pool.close()
 
 # Create FastAPI app with lifespan
 app = FastAPI(
@@ -74,25 +99,54 @@ app.add_middleware(
 app.include_router(knowledge_router)
 
 
-# Browser instance pool for reuse (to avoid startup costs)
-browser_pool = []
-MAX_POOL_SIZE = 2  # Adjust based on server resources
+def create_browser():
+    """Configure a browser-use browser for speed"""
+    chrome_path = get_chrome_path()
+    config = BrowserConfig(
+        chrome_instance_path=chrome_path,
+        headless=True,  # Headless mode for speed
+        disable_security=True,  # Disable security for speed (use with caution)
+    )
+    return Browser(config=config)
+
+async def create_browser_context(browser):
+    """Open an isolated context (own cookies, storage and tabs) for one task"""
+    return await new_isolated_context(browser)
+
+# A few long-lived browsers, launched ahead of time, each serving several isolated task contexts
+browser_pool = BrowserPool(create_browser, create_browser_context)
 
 # Initialize and load knowledge base once at startup
 def initialize_knowledge_base():
     """Initialize knowledge base with optimized settings for speed"""
     logger.info("Initializing knowledge base at application startup")
     try:
-        # Load with caching enabled
-        knowledge_base.load(recreate=True)
+        if KNOWLEDGE_SYNC_MODE == "recreate":
+            # Full rebuild: drop the table and re-embed every chunk
+            knowledge_base.load(recreate=True)
+        else:
+            # Only embed chunks whose content hash is not already stored
+            sync_knowledge_base(knowledge_base)
         logger.info("Knowledge base successfully loaded")
     except Exception as e:
         logger.error(f"Failed to load knowledge base: {str(e)}")
         # Continue running even if knowledge base fails - don't crash the server
 
+# How long a single email's draft stays open in its browser for the counselor to review,
+# unless acknowledged sooner via /api/task/{task_id}/acknowledge; 0 releases the browser at once
+REVIEW_HOLD_SECONDS = float(os.getenv("REVIEW_HOLD_SECONDS", "120"))
+# Longest hold a request may ask for; each hold keeps a browser context busy
+REVIEW_HOLD_MAX_SECONDS = float(os.getenv("REVIEW_HOLD_MAX_SECONDS", "900"))
+
 # Pydantic models for requests/responses
 class EmailRequest(BaseModel):
     slate_url: str
+    # Seconds to keep the draft open for review; None = REVIEW_HOLD_SECONDS
+    review_hold: Optional[float] = Field(None, ge=0, le=REVIEW_HOLD_MAX_SECONDS)
+
+class BulkEmailRequest(EmailRequest):
+    slate_url: str = ""  # The bulk endpoint always works on the Slate inbox
+    batch_size: Optional[int] = None  # Emails to draft; None = BULK_BATCH_SIZE
 
 class EmailResponse(BaseModel):
     message: str
@@ -104,64 +158,117 @@ class ErrorResponse(BaseModel):
 # Add chat endpoint
 add_chat_endpoint(app)
 
-# Global state for the Agno agent to avoid recreating it
-agno_agent = None
-
-# LRU cache to store response templates for common queries
-response_cache = {}
-
-@lru_cache(maxsize=1)  # Singleton pattern with LRU cache
-def get_agno_agent():
-    """Get or create the Agno agent (singleton pattern with caching)"""
-    global agno_agent
-    if agno_agent is None:
-        logger.info("Initializing Agno agent")
-        start_time = time.time()
-        agno_agent = AgnoAgent(
-            model=Gemini(
-                id="gemini-2.0-flash", 
-                api_key=API_KEY,
-                # Add parameters for faster response
-                temperature=0.2,  # Lower temperature for more deterministic responses
-            ),
-            role="Your role is Graduate enrollment counsellor of Illinois institude of technology chicago and you assist students in their queries.",
-            knowledge=knowledge_base,
-            search_knowledge=True,
-        )
-        logger.info(f"Agno agent initialized in {time.time() - start_time:.2f} seconds")
-    return agno_agent
+# Bounded cache of email drafts for common queries, shared by all workers
+EMAIL_CACHE_TTL = 3600  # 1 hour in seconds
+response_cache = ResponseCache("email", ttl=EMAIL_CACHE_TTL, shared=SharedDict("email_cache", ttl=EMAIL_CACHE_TTL))
+cache_dependencies.register("email", response_cache.evict, response_cache.evict_local)
 
-# Track active tasks to avoid resource contention
-active_tasks = {}
+EMAIL_AGENT_ROLE = "Your role is Graduate enrollment counsellor of Illinois institude of technology chicago and you assist students in their queries."
+EMAIL_PROMPT_TEMPLATE = (
+    "You are a graduate enrollment counselor at Illinois Institute of Technology."
+    "Search knowledge base and draft a formatted email ( no asterisks) response without an subject to: {question}\n"
+    "Be concise, professional, and make up a valid response (except email addresses and link) if you dont find anything related in knowledge."
+)
+# Fixed text of every email prompt, measured against the prompt token budget
+EMAIL_INSTRUCTIONS = EMAIL_AGENT_ROLE + "\n" + EMAIL_PROMPT_TEMPLATE.format(question="")
+
+# Model for each routing tier; the usual email model is the standard tier
+EMAIL_MODELS = model_router.register("email", "gemini-2.0-flash")
+
+def build_email_agent(model_id: str) -> AgnoAgent:
+    """Create an email-drafting agent backed by the knowledge base"""
+    start_time = time.time()
+    agent = AgnoAgent(
+        model=Gemini(
+            id=model_id, 
+            api_key=API_KEY,
+            # Add parameters for faster response
+            temperature=0.2,  # Lower temperature for more deterministic responses
+            client=shared_gemini_client(API_KEY),
+        ),
+        role=EMAIL_AGENT_ROLE,
+        knowledge=knowledge_base,
+        search_knowledge=True,
+    )
+    logger.info(f"Agno agent initialized in {time.time() - start_time:.2f} seconds")
+    return agent
+
+# Concurrent drafts (single and bulk) each check out their own agent, from the pool of the routed tier
+email_agent_pools = {
+    tier: AgentPool(f"email_{tier}", partial(build_email_agent, model_id))
+    for tier, model_id in EMAIL_MODELS.items()
+}
+
+# Track active tasks to avoid resource contention; shared so /api/task works from any worker
+TASK_TTL = 24 * 3600  # Keep finished task status for a day
+active_tasks = SharedDict("tasks", ttl=TASK_TTL)
+
+# Seconds between checks for an acknowledgement that arrived at another worker
+REVIEW_HOLD_POLL = 2.0
+# Tasks in this worker holding a browser for review, woken early when acknowledged here
+review_holds: Dict[str, asyncio.Event] = {}
+# Browser time spent per drafted email in this worker, for /api/admin/browser-stats
+browser_usage = {"tasks": 0, "emails": 0, "browser_seconds": 0.0, "hold_seconds": 0.0}
+
+async def record_drafted_email(task_id: str, url: str) -> None:
+    """Count an email whose reply a browser task pasted, once per email URL"""
+    def add(task: Optional[dict]) -> dict:
+        task = task or {}
+        drafted = task.get("drafted", [])
+        if url in drafted:
+            return task
+        return {**task, "emails": task.get("emails", 0) + 1, "drafted": drafted + [url]}
+
+    # Atomic, since the emails of a bulk run are drafted concurrently
+    await active_tasks.aupdate(task_id, add)
 
 # Function to generate response using Agno Agent with Gemini - optimized
-async def generate_response_with_agno(question: str) -> str:
-    """Generate a response to an email using Agno agent with Gemini model"""
+async def generate_response_with_agno(question: str, priority: str = "email") -> str:
+    """Generate a response to an email using Agno agent with Gemini model.
+
+    priority is the scheduler class the model call queues in ("email" or "bulk").
+    """
     # Check cache first
-    cache_key = hash(question.strip().lower())
-    if cache_key in response_cache:
+    cache_key = stable_digest(question)
+    cached_response = await response_cache.aget(cache_key)
+    if cached_response is not None:
         logger.info("Using cached response")
-        return response_cache[cache_key]
+        return cached_response
+
+    # No semantic reuse here: emails differing only in names or details embed almost
+    # identically, and another sender's draft must never be pasted into a reply
     
-    try:
-        # Get the agent - already initialized
-        agent = get_agno_agent()
-        
-        # Optimized prompt (shorter for faster processing)
-        prompt = (
-            f"You are a graduate enrollment counselor at Illinois Institute of Technology."
-            f"Search knowledge base and draft a formatted email ( no asterisks) response without an subject to: {question}\n"
-            f"Be concise, professional, and make up a valid response (except email addresses and link) if you dont find anything related in knowledge."
-        )
+    # The same email processed concurrently (e.g. bulk runs) shares one agent run
+    return await response_cache.single_flight(cache_key, lambda: _draft_email_response(question, cache_key, priority))
+
+async def _draft_email_response(question: str, cache_key: str, priority: str = "email") -> str:
+    """Run the agent to draft an email response and cache fast results"""
+    async def attempt(tier: str, timeout: float):
+        async def call(started):
+            # Optimized prompt (shorter for faster processing); long emails are cut to the question budget
+            plan = prompt_budget.plan("email", EMAIL_INSTRUCTIONS, question)
+            prompt = EMAIL_PROMPT_TEMPLATE.format(question=plan.question)
+            
+            # Set a timeout for the agent run to prevent hanging
+            async with llm_scheduler.slot(priority), email_agent_pools[tier].checkout() as agent:
+                started()
+                start_time = time.time()
+                with prompt_budget.track(plan):
+                    result = await asyncio.wait_for(
+                        agent.arun(prompt),  # Use async version if available
+                        timeout=timeout
+                    )
+            return result, time.time() - start_time
         
-        # Set a timeout for the agent run to prevent hanging
-        start_time = time.time()
-        result = await asyncio.wait_for(
-            agent.arun(prompt),  # Use async version if available
-            timeout=300  # 15 second timeout
-        )
+        # When enabled, a draft slower than usual is raced against a duplicate, unless
+        # other requests of its class are queued for the slot the duplicate would take
+        return await llm_hedger.run(f"email:{tier}", call, can_hedge=lambda: not llm_scheduler.queued(priority))
+    
+    try:
+        # Long or multi-part emails go to the strong model, simple ones to the fast model
+        decision = await model_router.route("email", question)
+        result, response_time = await model_router.run(decision, attempt, timeout=300, fallback_timeout=60)
         
-        response_time = time.time() - start_time
         logger.info(f"Response generated in {response_time:.2f} seconds")
         
         # Get response content
@@ -169,10 +276,16 @@ async def generate_response_with_agno(question: str) -> str:
         
         # Cache the response for future use if it's a common query
         if response_time < 5.0:  # Only cache fast responses (likely common queries)
-            response_cache[cache_key] = response_content
+            # Tag the draft with the knowledge sections it used so edits can evict it
+            section_ids = referenced_section_ids(result)
+            await response_cache.aset(cache_key, response_content)
+            await asyncio.to_thread(cache_dependencies.record, "email", cache_key, section_ids)
             
         return response_content
     
+    except LLMSchedulerBusy:
+        # Fail the browser action rather than paste an apology into the reply
+        raise
     except asyncio.TimeoutError:
         logger.error("Response generation timed out")
         return "I apologize, but I'm unable to generate a response at this time due to high demand. Please try again later."
@@ -180,37 +293,24 @@ async def generate_response_with_agno(question: str) -> str:
         logger.error(f"Error generating response: {str(e)}")
         return "I apologize, but I'm unable to generate a response at this time. Please try again later."
 
-async def get_browser_from_pool():
-    """Get a browser from the pool or create a new one"""
-    if browser_pool:
-        return browser_pool.pop()
-    else:
-        # Configure browser for speed
-        chrome_path = get_chrome_path()
-        config = BrowserConfig(
-            chrome_instance_path=chrome_path,
-            headless=True,  # Headless mode for speed
-            disable_security=True,  # Disable security for speed (use with caution)
-        )
-        return Browser(config=config)
+def _admit_llm_request(priority: str) -> None:
+    """Raise 429 with Retry-After when the scheduler queue for this class is full"""
+    try:
+        llm_scheduler.admit(priority)
+    except LLMSchedulerBusy as e:
+        logger.warning(f"Rejected {priority} request: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-async def return_browser_to_pool(browser):
-    """Return a browser to the pool for reuse"""
-    if len(browser_pool) < MAX_POOL_SIZE:
-        browser_pool.append(browser)
-    else:
-        await browser.close()
+EMAIL_AGENT_TASK = """
+    Click on the email to veiw it. Extract the full email message. Call process_email_content() with the content.
+    After receiving the response, find the reply area, paste the EXACT response, do not send.
+"""  # Simplified task for speed
 
-@app.post("/api/process-email", response_model=EmailResponse)
-async def process_email(request: EmailRequest, background_tasks: BackgroundTasks):
-    """Endpoint to process emails using browser-use - optimized"""
-
-    # Generate a unique task ID
-    task_id = f"task_{int(time.time() * 1000)}"
+def make_draft_agent(browser_context, slate_url: str, task_id: str, priority: str = "email", draft: Optional[str] = None):
+    """Create a browser agent that opens one email and pastes a drafted reply.
 
-    # Get a browser from the pool
-    browser = await get_browser_from_pool()
-    
+    A draft that was already generated is pasted as is instead of asking the model again.
+    """
     # Initialize controller with optimized settings
     controller = Controller()
     
@@ -225,47 +325,79 @@ async def process_email(request: EmailRequest, background_tasks: BackgroundTasks
         email_content["value"] = content
         
         # Generate a response with timeout
-        response = await generate_response_with_agno(content)
+        response = draft or await generate_response_with_agno(content, priority=priority)
         
         # Return the exact response to be used
         return response
     
     initial_actions = [
-        {'go_to_url': {'url': f'{request.slate_url}'}},
+        {'go_to_url': {'url': f'{slate_url}'}},
     ]
     # Create the agent with optimized settings
-    email_agent = BrowserAgent(
-        task=f"""
-            Click on the email to veiw it. Extract the full email message. Call process_email_content() with the content.
-            After receiving the response, find the reply area, paste the EXACT response, do not send.
-        """,  # Simplified task for speed
+    return BrowserAgent(
+        task=EMAIL_AGENT_TASK,
         llm=ChatGoogleGenerativeAI(
             model='gemini-2.5-pro-preview-03-25',
             temperature=0.2,  # Lower temperature for faster responses
             max_tokens=2048,  # Limit token count for speed
         ),
-        browser=browser,
+        browser_context=browser_context,
         use_vision=True,  # Keep vision for accuracy
         controller=controller,
         initial_actions=initial_actions,
         # max_steps=15,  # Limit steps for speed
     )
-    
-    # Run the agent in background to return response quickly
-    active_tasks[task_id] = {
-        "status": "running",
+
+async def draft_in_context(browser_context, slate_url: str, task_id: str, priority: str = "email") -> bool:
+    """Draft a reply to one email in the given browser context; True if the agent finished.
+
+    The selector fast path reads the email and fills the reply without any
+    vision step; the vision agent takes over when the page does not match
+    the known Slate layout, reusing the reply if it was already generated.
+    """
+    draft = None
+    if SLATE_DOM_FAST_PATH:
+        try:
+            page = await browser_context.get_current_page()
+            await draft_reply(page, slate_url, partial(generate_response_with_agno, priority=priority))
+            await record_drafted_email(task_id, slate_url)
+            fast_path_stats.drafted += 1
+            return True
+        except SlateLayoutError as e:
+            fast_path_stats.fallbacks["draft"] += 1
+            logger.info(f"DOM fast path did not match for {task_id}, using the vision agent: {str(e)}")
+            draft = e.draft
+    history = await make_draft_agent(browser_context, slate_url, task_id, priority, draft).run()
+    if not history.is_done():
+        return False
+    # Only a finished agent has pasted the reply; a retry after a failed paste must draft it again
+    await record_drafted_email(task_id, slate_url)
+    return True
+
+@app.post("/api/process-email", response_model=EmailResponse)
+async def process_email(request: EmailRequest, background_tasks: BackgroundTasks):
+    """Endpoint to process emails using browser-use - optimized"""
+
+    # Refuse before launching a browser if drafts are already backed up
+    _admit_llm_request("email")
+
+    # Generate a unique task ID
+    task_id = f"task_{uuid4().hex}"
+
+    # Run the agent in background to return response quickly; it queues until a browser is free
+    await active_tasks.aset(task_id, {
+        "status": "queued",
         "start_time": time.time(),
         "url": request.slate_url,
-    }
+    })
     
     # Use background tasks to run the agent without blocking
     background_tasks.add_task(
         run_agent_with_cleanup, 
-        email_agent, 
-        browser, 
+        partial(draft_in_context, slate_url=request.slate_url, task_id=task_id), 
         task_id, 
         active_tasks,
-        return_browser_to_pool
+        min(REVIEW_HOLD_SECONDS, REVIEW_HOLD_MAX_SECONDS) if request.review_hold is None else request.review_hold,
     )
     
     # Return immediately with task ID
@@ -273,22 +405,20 @@ async def process_email(request: EmailRequest, background_tasks: BackgroundTasks
         message="Browser has been launched to process the email. The AI will read the email and draft a response.",
         task_id=task_id,
     )
-        
-    # except Exception as e:
-    #     logger.error(f"Error processing email: {str(e)}")
-    #     # Attempt to return browser to pool even on error
-    #     if 'browser' in locals():
-    #         try:
-    #             await return_browser_to_pool(browser)
-    #         except:
-    #             pass
-    #     raise HTTPException(status_code=500, detail=f"Error processing email: {str(e)}")
-    
+
+# Bulk runs: how many inbox emails to draft, emails worked on at once (0 = browser pool
+# capacity), and the per-email deadline and retries
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "5"))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "0"))
+BULK_EMAIL_TIMEOUT = float(os.getenv("BULK_EMAIL_TIMEOUT", "120"))
+BULK_EMAIL_RETRIES = int(os.getenv("BULK_EMAIL_RETRIES", "1"))
+BULK_INBOX_URL = "https://apply.illinoistech.edu/manage/inbox/"
+
 @app.post("/api/process-bulk-email", response_model=EmailResponse)
-async def process_bulk_email(request: EmailRequest, background_tasks: BackgroundTasks):
-    """Endpoint to process emails using browser-use - optimized"""
+async def process_bulk_email(request: BulkEmailRequest, background_tasks: BackgroundTasks):
+    """Endpoint to draft replies to the newest inbox emails in parallel"""
     
-    request.slate_url = "https://apply.illinoistech.edu/manage/inbox/"
+    request.slate_url = BULK_INBOX_URL
 
     if not BROWSER_USE_AVAILABLE:
         raise HTTPException(
@@ -296,116 +426,199 @@ async def process_bulk_email(request: EmailRequest, background_tasks: Background
             detail="Browser-use framework is not available. Please install required dependencies."
         )
     
+    _admit_llm_request("bulk")
+    
     # Generate a unique task ID
-    task_id = f"task_{int(time.time() * 1000)}"
+    task_id = f"task_{uuid4().hex}"
     
-        # Get a browser from the pool
-    browser = await get_browser_from_pool()
+    await active_tasks.aset(task_id, {
+        "status": "queued",
+        "start_time": time.time(),
+        "url": request.slate_url,
+    })
     
-    # Initialize controller with optimized settings
-    controller = Controller()
+    # Use background tasks to run the batch without blocking
+    background_tasks.add_task(
+        run_bulk_inbox,
+        task_id,
+        request.slate_url,
+        request.batch_size or BULK_BATCH_SIZE,
+    )
     
-    # Create storage for the extracted email content
-    email_content = {"value": ""}
+    # Return immediately with task ID
+    return EmailResponse(
+        message="Browsers have been launched to process the inbox. The AI will read the emails and draft responses.",
+        task_id=task_id,
+    )
+
+async def enumerate_inbox(browser_context, inbox_url: str, limit: int) -> List[str]:
+    """Stage one of a bulk run: collect the URLs of the newest inbox emails"""
+    if SLATE_DOM_FAST_PATH:
+        try:
+            urls = await list_inbox_emails(await browser_context.get_current_page(), inbox_url, limit)
+            fast_path_stats.listed += 1
+            return urls
+        except SlateLayoutError as e:
+            fast_path_stats.fallbacks["inbox"] += 1
+            logger.info(f"DOM fast path did not match the inbox, using the vision agent: {str(e)}")
     
-    # Register the function to process email content - optimized for speed
-    @controller.action("Process Email Content")
-    async def process_email_content(content: str) -> str:
-        """Process the email content and generate a response"""
-        # Save the content
-        email_content["value"] = content
-        
-        # Generate a response with timeout
-        response = await generate_response_with_agno(content)
-        
-        # Return the exact response to be used
-        return response
+    controller = Controller()
+    found: List[str] = []
     
-    initial_actions = [
-        {'go_to_url': {'url': f'{request.slate_url}'}},
-    ]
-    # Create the agent with optimized settings
-    email_agent = BrowserAgent(
+    @controller.action("Report Inbox Emails")
+    async def report_inbox_emails(urls: List[str]) -> str:
+        """Record the URLs of the emails to process"""
+        found.extend(url for url in urls if url not in found)
+        return f"Recorded {len(found)} emails"
+    
+    agent = BrowserAgent(
         task=f"""
-            You are email processing agent. Your task is to process emails in the inbox.
-            Click on the email to veiw it. Extract the full email message. Call process_email_content() with the content.
-            After receiving the response, find the reply area, paste the EXACT response, do not send.
-            Go back on the inbox page and repeat the process for the next 4 emails.
-
-        """,  # Simplified task for speed
+            List the first {limit} emails in the inbox, newest first, without replying to any.
+            Get the URL that opens each email, then call report_inbox_emails() once with all the URLs and finish.
+        """,
         llm=ChatGoogleGenerativeAI(
             model='gemini-2.5-pro-preview-03-25',
-            temperature=0.2,  # Lower temperature for faster responses
-            max_tokens=2048,  # Limit token count for speed
+            temperature=0.2,
+            max_tokens=2048,
         ),
-        browser=browser,
-        use_vision=True,  # Keep vision for accuracy
+        browser_context=browser_context,
+        use_vision=True,
         controller=controller,
-        initial_actions=initial_actions,
-        # max_steps=15,  # Limit steps for speed
-    )
-    
-    # Run the agent in background to return response quickly
-    active_tasks[task_id] = {
-        "status": "running",
-        "start_time": time.time(),
-        "url": request.slate_url,
-    }
-    
-    # Use background tasks to run the agent without blocking
-    background_tasks.add_task(
-        run_agent_with_cleanup, 
-        email_agent, 
-        browser, 
-        task_id, 
-        active_tasks,
-        return_browser_to_pool
+        initial_actions=[{'go_to_url': {'url': inbox_url}}],
     )
+    await asyncio.wait_for(agent.run(), timeout=BULK_EMAIL_TIMEOUT)
+    return found[:limit]
+
+async def run_bulk_inbox(task_id: str, inbox_url: str, batch_size: int):
+    """Enumerate the inbox, then draft each email in its own browser context"""
+    browser_seconds = 0.0
     
-    # Return immediately with task ID
-    return EmailResponse(
-        message="Browser has been launched to process the email. The AI will read the email and draft a response.",
-        task_id=task_id,
-    )
+    async def draft_email(url: str):
+        nonlocal browser_seconds
+        # A retry after the reply was already pasted (e.g. the attempt timed out right after
+        # the paste) must not paste it a second time; emails are recorded only once pasted
+        if url in (await active_tasks.aget(task_id, {})).get("drafted", []):
+            logger.info(f"{url} was already drafted by an earlier attempt, not drafting it again")
+            return
+        async with browser_pool.checkout() as browser_context:
+            checkout_time = time.monotonic()
+            try:
+                done = await asyncio.wait_for(
+                    draft_in_context(browser_context, url, task_id, priority="bulk"),
+                    timeout=BULK_EMAIL_TIMEOUT,
+                )
+            finally:
+                browser_seconds += time.monotonic() - checkout_time
+        if not done:
+            raise RuntimeError("Agent stopped before finishing the draft")
     
-    # except Exception as e:
-    #     logger.error(f"Error processing email: {str(e)}")
-    #     # Attempt to return browser to pool even on error
-    #     if 'browser' in locals():
-    #         try:
-    #             await return_browser_to_pool(browser)
-    #         except:
-    #             pass
-    #     raise HTTPException(status_code=500, detail=f"Error processing email: {str(e)}")
-
-async def run_agent_with_cleanup(agent, browser, task_id, active_tasks, return_browser_func):
-    """Run the agent and clean up resources when done"""
     try:
-        # Run with timeout to prevent hanging
-        await asyncio.wait_for(
-            agent.run(),
-            timeout=120  # 2 minute timeout
+        async with browser_pool.checkout() as browser_context:
+            checkout_time = time.monotonic()
+            await active_tasks.aupdate_item(task_id, status="enumerating")
+            try:
+                urls = await enumerate_inbox(browser_context, inbox_url, batch_size)
+            finally:
+                browser_seconds += time.monotonic() - checkout_time
+        if not urls:
+            raise RuntimeError("No emails found in the inbox")
+        
+        await active_tasks.aupdate_item(task_id, status="running")
+        items = await run_work_queue(
+            urls,
+            draft_email,
+            workers=BULK_WORKERS or browser_pool.capacity,
+            retries=BULK_EMAIL_RETRIES,
+            on_update=lambda items: active_tasks.aupdate_item(task_id, items=[item.to_dict() for item in items]),
         )
-        active_tasks[task_id]["status"] = "completed"
+        completed = sum(item.status == "completed" for item in items)
+        status = "completed" if completed == len(items) else "partial" if completed else "failed"
+        await active_tasks.aupdate_item(task_id, status=status, end_time=time.time())
     except Exception as e:
-        logger.error(f"Error in agent execution: {str(e)}")
-        active_tasks[task_id]["status"] = "failed"
+        logger.error(f"Bulk run {task_id} failed: {str(e)}")
+        await active_tasks.aupdate_item(task_id, status="failed", end_time=time.time())
+    finally:
+        await _record_browser_usage(task_id, browser_seconds, 0.0)
+
+async def hold_for_review(task_id: str, hold: float) -> str:
+    """Keep the drafted reply open until the counselor acknowledges it or the hold expires"""
+    event = review_holds[task_id] = asyncio.Event()
+    deadline = time.monotonic() + hold
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return "expired"
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(REVIEW_HOLD_POLL, remaining))
+                return "acknowledged"
+            except asyncio.TimeoutError:
+                # The acknowledgement may have reached another worker
+                if (await active_tasks.aget(task_id, {})).get("acknowledged"):
+                    return "acknowledged"
     finally:
-        active_tasks[task_id]["end_time"] = time.time()
-        # Keep browser session open for only 2 minutes instead of 5
-        await asyncio.sleep(120)
-        # Return browser to pool for reuse
-        await return_browser_func(browser)
+        review_holds.pop(task_id, None)
+
+async def run_agent_with_cleanup(run_task, task_id, active_tasks, review_hold: float = 0):
+    """Wait for a pooled browser context, run the task in it and close it when done.
+
+    A finished draft keeps the context open for up to review_hold seconds so
+    the counselor can review it. Failures (including an agent that stopped
+    before finishing), unattended runs and runs that drafted nothing close
+    it at once.
+    """
+    try:
+        async with browser_pool.checkout() as browser_context:
+            checkout_time = time.monotonic()
+            hold_seconds = 0.0
+            await active_tasks.aupdate_item(task_id, status="running")
+            try:
+                # Run with timeout to prevent hanging
+                done = await asyncio.wait_for(
+                    run_task(browser_context),
+                    timeout=120  # 2 minute timeout
+                )
+                if not done:
+                    raise RuntimeError("Agent stopped before finishing the draft")
+                await active_tasks.aupdate_item(task_id, status="completed", end_time=time.time())
+            except Exception as e:
+                logger.error(f"Error in agent execution: {str(e)}")
+                await active_tasks.aupdate_item(task_id, status="failed", end_time=time.time())
+            else:
+                # Nothing to review unless a reply was actually pasted
+                drafted = (await active_tasks.aget(task_id, {})).get("emails", 0) > 0
+                if review_hold > 0 and drafted:
+                    await active_tasks.aupdate_item(task_id, status="awaiting_review", hold_until=time.time() + review_hold)
+                    hold_start = time.monotonic()
+                    released_by = await hold_for_review(task_id, review_hold)
+                    hold_seconds = time.monotonic() - hold_start
+                    await active_tasks.aupdate_item(task_id, status="completed", released_by=released_by)
+            finally:
+                await _record_browser_usage(task_id, time.monotonic() - checkout_time, hold_seconds)
+    except Exception as e:
+        # No browser could be checked out (launch failure, wait timeout or shutdown)
+        logger.error(f"Could not get a browser for {task_id}: {str(e)}")
+        await active_tasks.aupdate_item(task_id, status="failed", end_time=time.time())
+
+async def _record_browser_usage(task_id: str, browser_seconds: float, hold_seconds: float) -> None:
+    """Store the task's browser time and add it to the per-email totals"""
+    emails = (await active_tasks.aget(task_id, {})).get("emails", 0)
+    browser_usage["tasks"] += 1
+    browser_usage["emails"] += emails
+    browser_usage["browser_seconds"] += browser_seconds
+    browser_usage["hold_seconds"] += hold_seconds
+    await active_tasks.aupdate_item(task_id, browser_seconds=round(browser_seconds, 2))
+    per_email = f"{browser_seconds / emails:.1f}s per email" if emails else "no emails drafted"
+    logger.info(f"{task_id} held a browser for {browser_seconds:.1f}s ({hold_seconds:.1f}s in review), {per_email}")
 
 # Add new endpoint to check task status
 @app.get("/api/task/{task_id}")
 async def get_task_status(task_id: str):
     """Get the status of a running task"""
-    if task_id not in active_tasks:
+    task_info = await active_tasks.aget(task_id)
+    if task_info is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task_info = active_tasks[task_id]
-    
     # Calculate duration if task is completed
     if "end_time" in task_info:
         duration = task_info["end_time"] - task_info["start_time"]
@@ -417,8 +630,25 @@ async def get_task_status(task_id: str):
         "status": task_info["status"],
         "duration": f"{duration:.2f} seconds",
         "url": task_info["url"],
+        "emails": task_info.get("emails", 0),
+        "browser_seconds": task_info.get("browser_seconds"),
+        # Per-email status of a bulk run
+        **({"items": task_info["items"]} if "items" in task_info else {}),
     }
 
+@app.post("/api/task/{task_id}/acknowledge")
+async def acknowledge_task(task_id: str):
+    """Mark a drafted reply as reviewed so its browser is released"""
+    task_info = await active_tasks.aget(task_id)
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    await active_tasks.aupdate_item(task_id, acknowledged=True)
+    # Wake the hold right away if it runs in this worker; other workers see the flag when they poll
+    event = review_holds.get(task_id)
+    if event is not None:
+        event.set()
+    return {"task_id": task_id, "status": task_info["status"], "acknowledged": True}
+
 @lru_cache(maxsize=4)  # Cache Chrome path detection
 def get_chrome_path():
     """Detect the Chrome browser path based on the operating system with caching"""
@@ -454,12 +684,52 @@ def get_chrome_path():
 @app.post("/api/admin/clear-cache")
 async def clear_cache():
     """Clear all caches to refresh the system"""
-    global response_cache
-    response_cache = {}
+    response_cache.clear()
+    semantic_cache.clear()
+    cache_dependencies.clear()
     get_chrome_path.cache_clear()
-    get_agno_agent.cache_clear()
+    for pool in _agent_pools():
+        pool.clear()
     return {"status": "Cache cleared successfully"}
 
+# Semantic cache hit statistics
+@app.get("/api/admin/cache-stats")
+async def cache_stats():
+    """Get hit statistics for the semantic and exact-match response caches"""
+    return {
+        **semantic_cache.stats(),
+        "response_caches": {"chat": chat_response_cache.stats(), "email": response_cache.stats()},
+    }
+
+def _agent_pools():
+    return [*chat_agent_pools.values(), *streaming_agent_pools.values(), *email_agent_pools.values()]
+
+# Model call scheduling: per-class slots, queues and waits, agent pool usage, routing decisions and hedging
+@app.get("/api/admin/llm-stats")
+async def llm_stats():
+    """Get admission and queueing statistics for model calls"""
+    return {
+        **llm_scheduler.stats(),
+        "agent_pools": {pool.name: pool.stats() for pool in _agent_pools()},
+        "router": model_router.stats(),
+        "hedging": llm_hedger.stats(),
+    }
+
+# Browser pool usage: open, idle and busy browsers, checkout waits and utilization
+@app.get("/api/admin/browser-stats")
+async def browser_stats():
+    """Get browser pool statistics and browser time per drafted email"""
+    emails = browser_usage["emails"]
+    return {
+        **browser_pool.stats(),
+        "dom_fast_path": fast_path_stats.stats(),
+        "usage": {
+            **{key: round(value, 2) for key, value in browser_usage.items()},
+            "browser_seconds_per_email": round(browser_usage["browser_seconds"] / emails, 2) if emails else None,
+            "active_review_holds": len(review_holds),
+        },
+    }
+
 # Simple health check endpoint (optimized)
 @app.get("/api/health")
 async def health_check():
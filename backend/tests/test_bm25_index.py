@@ -0,0 +1,37 @@
+from app.agno_manager.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_codes_and_drops_stopwords():
+    assert tokenize("What is the 221G form for my I-20?") == ["221g", "form", "20"]
+
+
+def test_search_ranks_exact_terms_and_supports_removal():
+    index = BM25Index()
+    index.add("i20", "Request an I-20 after paying the enrollment deposit")
+    index.add("visa", "A 221G notice means administrative processing of the visa")
+    index.add("fees", "Tuition and fees for the 2025-2026 year")
+    assert index.search("221G visa delay")[0][0] == "visa"
+    assert [doc_id for doc_id, _ in index.search("tuition fees", limit=1)] == ["fees"]
+    assert index.search("deposit", predicate=lambda doc_id: doc_id != "i20") == []
+
+    assert index.remove("visa")
+    assert not index.remove("visa")
+    assert "visa" not in index
+    assert index.search("221G") == []
+    # A freed slot is reused without mixing up postings
+    index.add("waiver", "Application fee waiver codes")
+    assert index.search("waiver")[0][0] == "waiver"
+    assert len(index) == 3
+
+
+def test_replacing_a_document_drops_its_old_terms():
+    index = BM25Index()
+    index.add("doc", "old deadline")
+    index.add("doc", "new deadline")
+    assert index.search("old") == []
+    assert index.search("new")[0][0] == "doc"
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"], ["b"]])
+    assert [doc_id for doc_id, _ in fused][:2] == ["b", "a"]
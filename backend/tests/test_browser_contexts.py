@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+browser_use = pytest.importorskip("browser_use")
+
+from app.browser_contexts import new_isolated_context
+
+SIGN_IN = {"name": "slate_session", "value": "signed-in", "domain": "example.com", "path": "/"}
+
+
+async def launch_browser():
+    """Headless browser-use browser, or skip when Chromium is not installed"""
+    browser = browser_use.Browser(config=browser_use.BrowserConfig(headless=True))
+    try:
+        playwright_browser = await browser.get_playwright_browser()
+    except Exception as e:
+        await browser.close()
+        pytest.skip(f"headless Chromium is not available: {e}")
+    return browser, playwright_browser
+
+
+def test_isolated_context_carries_sign_in_and_closes_cleanly():
+    async def main():
+        browser, playwright_browser = await launch_browser()
+        try:
+            default = await playwright_browser.new_context()
+            await default.add_cookies([SIGN_IN])
+
+            first = await new_isolated_context(browser)
+            second = await new_isolated_context(browser)
+            first_playwright = first.session.context
+            assert first_playwright is not default
+            assert first_playwright is not second.session.context
+            assert [c["value"] for c in await first_playwright.cookies()] == ["signed-in"]
+
+            # Contexts are isolated: a cookie set in one is not seen by the other
+            await first_playwright.add_cookies([{**SIGN_IN, "name": "draft"}])
+            assert "draft" not in [c["name"] for c in await second.session.context.cookies()]
+
+            page = await first.get_current_page()
+            await page.set_content("<p>ready</p>")
+            assert await page.inner_text("p") == "ready"
+
+            await first.close()
+            assert first.session is None
+            assert first_playwright not in playwright_browser.contexts
+            assert second.session.context in playwright_browser.contexts
+            assert default in playwright_browser.contexts
+            await second.close()
+        finally:
+            await browser.close()
+
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from app.browser_pool import BrowserPool, BrowserPoolClosed
+
+
+class FakePlaywrightBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.playwright_browser = None
+        self.closed = False
+
+    async def get_playwright_browser(self):
+        self.playwright_browser = FakePlaywrightBrowser()
+
+    async def close(self):
+        await asyncio.sleep(0.01)
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def close(self):
+        pass
+
+
+async def new_context(browser):
+    return FakeContext(browser)
+
+
+def make_pool(**kwargs):
+    browsers = []
+
+    def factory():
+        browsers.append(FakeBrowser())
+        return browsers[-1]
+
+    return BrowserPool(factory, new_context, **kwargs), browsers
+
+
+def test_contexts_share_browsers_up_to_the_cap():
+    async def main():
+        pool, browsers = make_pool(size=2, contexts_per_browser=2)
+        peak = 0
+        active = 0
+
+        async def task():
+            nonlocal peak, active
+            async with pool.checkout():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        await asyncio.gather(*(task() for _ in range(7)))
+        assert peak == pool.capacity == 4
+        assert len(browsers) == 2
+        assert pool.stats()["checkouts"] == 7
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_browser_is_retired_after_max_uses():
+    async def main():
+        pool, browsers = make_pool(size=1, contexts_per_browser=1, max_uses=2)
+        for _ in range(3):
+            async with pool.checkout():
+                pass
+        await pool.close()
+        assert len(browsers) == 2
+        assert all(browser.closed for browser in browsers)
+
+    asyncio.run(main())
+
+
+def test_close_waits_for_busy_contexts():
+    async def main():
+        pool, browsers = make_pool(size=1)
+
+        async def task():
+            async with pool.checkout():
+                await asyncio.sleep(0.1)
+
+        running = asyncio.create_task(task())
+        await asyncio.sleep(0.01)
+        await pool.close(timeout=5)
+        # The busy browser was closed before close() returned, not in a stray task
+        assert browsers[0].closed
+        assert running.done()
+        with pytest.raises(BrowserPoolClosed):
+            async with pool.checkout():
+                pass
+
+    asyncio.run(main())
+
+
+def test_close_force_closes_browsers_that_stay_busy():
+    async def main():
+        pool, browsers = make_pool(size=1)
+        released = asyncio.Event()
+
+        async def task():
+            async with pool.checkout():
+                await released.wait()
+
+        running = asyncio.create_task(task())
+        await asyncio.sleep(0.01)
+        await pool.close(timeout=0.05)
+        assert browsers[0].closed
+        released.set()
+        await running
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.optimized_chat_endpoint as chat_endpoint
+from app.model_router import model_router
+
+
+def chat_client(monkeypatch, run):
+    """Client for the chat endpoint with the model call replaced by run()"""
+    async def route(path, question):
+        return SimpleNamespace(tier="standard", model="test-model")
+
+    semantic_writes = []
+
+    async def semantic_set(*args, **kwargs):
+        semantic_writes.append(args)
+
+    monkeypatch.setattr(model_router, "route", route)
+    monkeypatch.setattr(model_router, "run", run)
+    monkeypatch.setattr(chat_endpoint.semantic_cache, "aset", semantic_set)
+    app = FastAPI()
+    chat_endpoint.add_chat_endpoint(app)
+    return TestClient(app), semantic_writes
+
+
+def ask(client, message):
+    response = client.post("/api/chat", json={"message": message, "user_id": "tester"})
+    assert response.status_code == 200
+    return response.json()["response"]
+
+
+def test_timeout_apology_is_not_cached(monkeypatch):
+    async def times_out(decision, call, timeout):
+        raise asyncio.TimeoutError()
+
+    client, semantic_writes = chat_client(monkeypatch, times_out)
+    message = "When does the spring term start?"
+    assert ask(client, message).startswith("I apologize")
+    assert asyncio.run(chat_endpoint._check_cache(chat_endpoint._generate_cache_key(message))) is None
+    assert semantic_writes == []
+
+
+def test_answer_is_cached(monkeypatch):
+    async def answers(decision, call, timeout):
+        return SimpleNamespace(content="The spring term starts in January.", extra_data=None)
+
+    client, semantic_writes = chat_client(monkeypatch, answers)
+    message = "When does the fall term begin?"
+    assert ask(client, message) == "The spring term starts in January."
+    assert asyncio.run(chat_endpoint._check_cache(chat_endpoint._generate_cache_key(message))) is not None
+    assert len(semantic_writes) == 1
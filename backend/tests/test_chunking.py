@@ -0,0 +1,37 @@
+from app.agno_manager.chunking import _split_sections, chunk_content, section_id_for
+
+CORPUS = """# Admissions
+## Email Templates
+### Template
+Thank you for applying.
+## Call Scripts
+### Template
+Hello, this is the admissions office.
+"""
+
+
+def test_section_id_includes_parent_headings():
+    assert section_id_for(["Admissions", "Email Templates", "Template"]) == "admissions--email-templates--template"
+    assert section_id_for(["Email", "Templates"]) != section_id_for(["Email Templates"])
+    assert section_id_for([]) == "untitled"
+
+
+def test_duplicate_titles_get_distinct_section_ids():
+    sections = _split_sections(CORPUS)
+    assert [section["title"] for section in sections] == ["Template", "Template"]
+    assert [section["id"] for section in sections] == [
+        "admissions--email-templates--template",
+        "admissions--call-scripts--template",
+    ]
+
+    documents = chunk_content(CORPUS)
+    assert sorted(doc.meta_data["section_id"] for doc in documents) == [
+        "admissions--call-scripts--template",
+        "admissions--email-templates--template",
+    ]
+    assert len({doc.id for doc in documents}) == 2
+
+
+def test_explicit_section_id_wins():
+    documents = chunk_content("### Template\nHi", section_id="kb-7")
+    assert [doc.meta_data["section_id"] for doc in documents] == ["kb-7"]
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+
+
+class FakePlaywrightBrowser:
+    def is_connected(self):
+        return True
+
+
+class FakeBrowser:
+    playwright_browser = None
+
+    async def get_playwright_browser(self):
+        self.playwright_browser = FakePlaywrightBrowser()
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    async def close(self):
+        pass
+
+
+async def fake_new_context(browser):
+    return FakeContext()
+
+
+@pytest.fixture(autouse=True)
+def fake_browsers(monkeypatch):
+    monkeypatch.setattr(main.browser_pool, "factory", FakeBrowser)
+    monkeypatch.setattr(main.browser_pool, "new_context", fake_new_context)
+
+
+def run_email_task(task_id: str, run_task, review_hold: float = 0):
+    main.active_tasks[task_id] = {"status": "queued", "start_time": time.time(), "url": "https://slate/email/1"}
+    asyncio.run(main.run_agent_with_cleanup(run_task, task_id, main.active_tasks, review_hold))
+    return main.active_tasks[task_id]
+
+
+def test_unfinished_agent_fails_and_is_not_held():
+    async def run_task(browser_context):
+        # The reply was drafted but the agent gave up before pasting it
+        await main.record_drafted_email("task_stopped", "https://slate/email/1")
+        return False
+
+    started = time.monotonic()
+    task = run_email_task("task_stopped", run_task, review_hold=5)
+    assert task["status"] == "failed"
+    assert "hold_until" not in task
+    assert time.monotonic() - started < 2
+
+
+def test_finished_draft_is_held_for_review():
+    async def run_task(browser_context):
+        await main.record_drafted_email("task_finished", "https://slate/email/1")
+        return True
+
+    task = run_email_task("task_finished", run_task, review_hold=0.2)
+    assert task["status"] == "completed"
+    assert task["released_by"] == "expired"
+
+
+def test_vision_fallback_reuses_a_generated_draft(monkeypatch):
+    import app.slate_dom as slate_dom
+
+    generated = []
+    handed_over = []
+
+    class Page:
+        pass
+
+    class Context:
+        async def get_current_page(self):
+            return Page()
+
+    async def read_message(page, url):
+        return "When is the deposit due?"
+
+    async def fill_reply(page, text):
+        raise slate_dom.SlateLayoutError("No reply editor")
+
+    async def generate(content, priority="email"):
+        generated.append(content)
+        return "The deposit is due May 1."
+
+    class Agent:
+        async def run(self):
+            class History:
+                def is_done(self):
+                    return True
+            return History()
+
+    def make_draft_agent(browser_context, slate_url, task_id, priority="email", draft=None):
+        handed_over.append(draft)
+        return Agent()
+
+    monkeypatch.setattr(main, "SLATE_DOM_FAST_PATH", True)
+    monkeypatch.setattr(slate_dom, "read_message", read_message)
+    monkeypatch.setattr(slate_dom, "fill_reply", fill_reply)
+    monkeypatch.setattr(main, "generate_response_with_agno", generate)
+    monkeypatch.setattr(main, "make_draft_agent", make_draft_agent)
+
+    assert asyncio.run(main.draft_in_context(Context(), "https://slate/email/1", "task_fallback"))
+    assert generated == ["When is the deposit due?"]
+    assert handed_over == ["The deposit is due May 1."]
+
+
+def test_bulk_retry_drafts_an_email_whose_paste_failed(monkeypatch):
+    import app.slate_dom as slate_dom
+
+    attempts = []
+
+    class Context:
+        async def get_current_page(self):
+            return object()
+
+        async def close(self):
+            pass
+
+    async def new_context(browser):
+        return Context()
+
+    async def enumerate_inbox(browser_context, inbox_url, limit):
+        return ["https://slate/email/1"]
+
+    async def read_message(page, url):
+        return "Can I defer my admission?"
+
+    async def fill_reply(page, text):
+        raise slate_dom.SlateLayoutError("No reply editor")
+
+    async def generate(content, priority="email"):
+        return "Yes, for one year."
+
+    class Agent:
+        async def run(self):
+            attempts.append(1)
+            # The first agent generated the reply but could not paste it
+            done = len(attempts) > 1
+
+            class History:
+                def is_done(self):
+                    return done
+            return History()
+
+    monkeypatch.setattr(main.browser_pool, "new_context", new_context)
+    monkeypatch.setattr(main, "SLATE_DOM_FAST_PATH", True)
+    monkeypatch.setattr(main, "BULK_EMAIL_RETRIES", 1)
+    monkeypatch.setattr(main, "enumerate_inbox", enumerate_inbox)
+    monkeypatch.setattr(slate_dom, "read_message", read_message)
+    monkeypatch.setattr(slate_dom, "fill_reply", fill_reply)
+    monkeypatch.setattr(main, "generate_response_with_agno", generate)
+    monkeypatch.setattr(main, "make_draft_agent", lambda *args: Agent())
+
+    main.active_tasks["task_bulk_retry"] = {"status": "queued", "start_time": time.time(), "url": "https://slate/inbox"}
+    asyncio.run(main.run_bulk_inbox("task_bulk_retry", "https://slate/inbox", 1))
+    task = main.active_tasks["task_bulk_retry"]
+    assert len(attempts) == 2
+    assert task["status"] == "completed"
+    assert task["emails"] == 1
+    assert task["items"][0]["attempts"] == 2
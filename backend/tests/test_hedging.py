@@ -0,0 +1,152 @@
+from collections import deque
+import asyncio
+import random
+
+from app.hedging import Hedger
+from app.llm_scheduler import LLMScheduler
+
+KEY = "chat:standard"
+
+
+class FakeModel:
+    """Model call whose latency is drawn from an injected distribution"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.calls = 0
+
+    async def arun(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(next(self.latencies))
+        return "answer"
+
+
+def long_tail(seed: int, slow: float = 0.2, slow_share: float = 0.05):
+    """Calls of 5-15ms with an occasional straggler"""
+    rng = random.Random(seed)
+    while True:
+        yield slow if rng.random() < slow_share else rng.uniform(0.005, 0.015)
+
+
+def constant(latency: float):
+    while True:
+        yield latency
+
+
+def make_call(scheduler: LLMScheduler, model: FakeModel):
+    """The shape of the app's calls: queue for a slot, then call the model"""
+    async def call(started):
+        async with scheduler.slot("chat"):
+            started()
+            return await model.arun()
+    return call
+
+
+def scheduler(limit: int) -> LLMScheduler:
+    return LLMScheduler(max_concurrency=limit, classes={"chat": (limit, 100, 0.0)})
+
+
+def hedger(known_latency: float = None, **overrides) -> Hedger:
+    settings = dict(enabled=True, percentile=90, budget=0.3, window=200, min_samples=10)
+    settings.update(overrides)
+    h = Hedger(**settings)
+    if known_latency is not None:
+        # Skip the warm-up: hedge after known_latency, with room in the budget
+        h.min_samples = 1
+        h._latencies[KEY] = deque([known_latency], maxlen=h.window)
+        h.calls = 10
+    return h
+
+
+def test_latency_excludes_queue_wait():
+    h = hedger(min_samples=1000)  # record only, never hedge
+    call = make_call(scheduler(1), FakeModel(constant(0.02)))
+
+    async def main():
+        # Four calls share one slot, so the last one waits behind the other three
+        await asyncio.gather(*(h.run(KEY, call) for _ in range(4)))
+
+    asyncio.run(main())
+    samples = list(h._latencies[KEY])
+    assert len(samples) == 4
+    assert max(samples) < 0.05
+
+
+def test_queue_wait_does_not_trigger_a_hedge():
+    model = FakeModel(constant(0.02))
+    slots = scheduler(1)
+    h = hedger(known_latency=0.05)
+
+    async def main():
+        async with slots.slot("chat"):
+            # Waits for the slot far longer than the hedge delay
+            task = asyncio.ensure_future(h.run(KEY, make_call(slots, model)))
+            await asyncio.sleep(0.2)
+        return await task
+
+    assert asyncio.run(main()) == "answer"
+    assert h.hedged == 0
+    assert model.calls == 1
+
+
+def test_slow_model_call_is_hedged():
+    model = FakeModel(iter([0.5, 0.01]))
+    h = hedger(known_latency=0.05)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await h.run(KEY, make_call(scheduler(2), model))
+        return result, loop.time() - start
+
+    result, elapsed = asyncio.run(main())
+    assert result == "answer"
+    assert (h.hedged, h.hedge_wins, model.calls) == (1, 1, 2)
+    assert elapsed < 0.2
+
+
+def test_hedging_cuts_the_tail_within_budget():
+    def run_all(h: Hedger) -> list:
+        call = make_call(scheduler(8), FakeModel(long_tail(seed=7)))
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            elapsed = []
+            for _ in range(120):
+                start = loop.time()
+                await h.run(KEY, call)
+                elapsed.append(loop.time() - start)
+            return elapsed
+
+        # Only calls after the warm-up window can be hedged
+        return asyncio.run(main())[h.min_samples:]
+
+    baseline = run_all(hedger(enabled=False))
+    h = hedger()
+    hedged = run_all(h)
+
+    def stragglers(elapsed):
+        return sum(latency > 0.1 for latency in elapsed)
+
+    assert h.hedged > 0
+    assert h.hedged <= h.budget * h.calls
+    assert stragglers(hedged) < stragglers(baseline) / 2
+    assert sum(hedged) < sum(baseline)
+
+
+def test_no_hedge_while_requests_are_queued():
+    model = FakeModel(constant(0.2))
+    slots = scheduler(2)
+    h = hedger(known_latency=0.01)
+
+    async def main():
+        call = make_call(slots, model)
+        first = asyncio.ensure_future(h.run(KEY, call, can_hedge=lambda: not slots.queued("chat")))
+        await asyncio.sleep(0)
+        # One more request takes the other slot and a third waits in the queue
+        await asyncio.gather(first, call(lambda: None), call(lambda: None))
+
+    asyncio.run(main())
+    assert h.hedged == 0
+    assert h.busy_skipped == 1
+    assert model.calls == 3
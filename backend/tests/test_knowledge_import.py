@@ -0,0 +1,21 @@
+from app.agno_manager import text_documents
+from app.agno_manager.chunking import chunk_content
+from app.knowledge_endpoint import parse_text_documents
+
+
+def test_import_keeps_the_chunker_section_boundaries():
+    sections = parse_text_documents()
+    static_ids = {doc.meta_data["section_id"] for doc in chunk_content(text_documents.content_data)}
+    assert {section["id"] for section in sections} == static_ids
+    assert len({section["id"] for section in sections}) == len(sections)
+
+    titles = [section["title"] for section in sections]
+    # "#" and "##" sections are no longer folded into the "###" section before them
+    assert "Financial Aid" in titles
+    assert "Policy Notes" in titles
+    assert "Aplication Fee Waiver" in titles
+
+
+def test_import_keeps_paragraph_breaks():
+    financial_aid = next(section for section in parse_text_documents() if section["title"] == "Financial Aid")
+    assert "\n\n" in financial_aid["content"]
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.llm_scheduler import LLMScheduler, LLMSchedulerBusy
+
+
+def make_scheduler(max_concurrency=2):
+    # (concurrency, queue length, max queue wait)
+    return LLMScheduler(max_concurrency, {"chat": (2, 2, 0.0), "bulk": (1, 2, 0.0)})
+
+
+def test_class_and_global_caps_are_respected():
+    async def main():
+        scheduler = LLMScheduler(2, {"chat": (2, 5, 0.0), "bulk": (1, 5, 0.0)})
+        peak = {"chat": 0, "bulk": 0, "all": 0}
+        active = {"chat": 0, "bulk": 0}
+
+        async def call(priority):
+            async with scheduler.slot(priority):
+                active[priority] += 1
+                peak[priority] = max(peak[priority], active[priority])
+                peak["all"] = max(peak["all"], sum(active.values()))
+                await asyncio.sleep(0.01)
+                active[priority] -= 1
+
+        await asyncio.gather(*(call("chat") for _ in range(2)), *(call("bulk") for _ in range(3)))
+        assert peak == {"chat": 2, "bulk": 1, "all": 2}
+
+    asyncio.run(main())
+
+
+def test_freed_slot_goes_to_the_highest_priority_waiter():
+    async def main():
+        scheduler = make_scheduler(max_concurrency=1)
+        order = []
+
+        async def call(priority, name):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        holder = asyncio.create_task(call("chat", "first"))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(call("bulk", "bulk"))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(call("chat", "chat"))
+        await asyncio.gather(holder, bulk, chat)
+        assert order == ["first", "chat", "bulk"]
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_rejected_up_front_with_a_retry_hint():
+    async def main():
+        scheduler = make_scheduler(max_concurrency=1)
+        release = asyncio.Event()
+
+        async def call():
+            async with scheduler.slot("bulk"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(call()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert scheduler.queued("bulk") == 2
+        with pytest.raises(LLMSchedulerBusy) as busy:
+            scheduler.admit("bulk")
+        assert busy.value.retry_after >= 1
+        with pytest.raises(LLMSchedulerBusy):
+            await scheduler.acquire("bulk")
+        # Other classes still get a queue place
+        scheduler.admit("chat")
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.stats()["classes"]["bulk"]["rejected"] == 2
+
+    asyncio.run(main())
+
+
+def test_wait_longer_than_the_class_allows_is_rejected():
+    async def main():
+        scheduler = LLMScheduler(1, {"chat": (1, 5, 0.05)})
+        async with scheduler.slot("chat"):
+            with pytest.raises(LLMSchedulerBusy):
+                await scheduler.acquire("chat")
+        assert scheduler.queued("chat") == 0
+        # The slot is free again after the rejection
+        async with scheduler.slot("chat"):
+            pass
+
+    asyncio.run(main())
+
+
+def test_endpoint_admission_returns_429_with_retry_after(monkeypatch):
+    import main
+
+    def busy(priority):
+        raise LLMSchedulerBusy(priority, 7)
+
+    monkeypatch.setattr(main.llm_scheduler, "admit", busy)
+    with pytest.raises(HTTPException) as rejected:
+        main._admit_llm_request("email")
+    assert rejected.value.status_code == 429
+    assert rejected.value.headers == {"Retry-After": "7"}
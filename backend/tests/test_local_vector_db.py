@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+
+from agno.document.base import Document
+from agno.embedder.base import Embedder
+from agno.vectordb.search import SearchType
+
+from app.agno_manager.bm25_index import tokenize
+from app.agno_manager.local_vector_db import LocalVectorDb
+
+TOPICS = ["deposit", "visa", "tuition", "transcript"]
+
+
+@dataclass
+class TopicEmbedder(Embedder):
+    """One dimension per topic word, so similarity is predictable"""
+
+    dimensions: int = len(TOPICS)
+
+    def get_embedding(self, text):
+        words = tokenize(text)
+        return [float(words.count(topic)) + 0.01 for topic in TOPICS]
+
+    def get_embedding_and_usage(self, text):
+        return self.get_embedding(text), None
+
+
+def make_db(search_type=SearchType.vector):
+    db = LocalVectorDb(TopicEmbedder(), search_type=search_type, refresh_seconds=0)
+    db.create()
+    db.insert([
+        Document(id="deposit", content="The enrollment deposit is refundable until May 1", meta_data={"section_id": "fees"}),
+        Document(id="visa", content="Visa appointments and the 221G notice", meta_data={"section_id": "visa"}),
+        Document(id="tuition", content="Tuition is charged per credit hour", meta_data={"section_id": "fees"}),
+    ])
+    return db
+
+
+def test_vector_search_returns_the_closest_documents_with_scores():
+    db = make_db()
+    results = db.search("When is the deposit refundable?", limit=2)
+    assert results[0].id == "deposit"
+    assert results[0].meta_data["score"] > results[1].meta_data["score"]
+    assert db.top_similarity("deposit") > 0.9
+
+
+def test_upsert_replaces_and_delete_removes():
+    db = make_db()
+    db.upsert([Document(id="deposit", content="Visa fees are paid online", meta_data={"section_id": "fees"})])
+    assert db.get_count() == 3
+    # The old text is gone from both the vectors and the keyword index
+    assert db.top_similarity("deposit") < 0.5
+    assert db.keyword_search("refundable") == []
+    assert db.get_content_hashes({"visa"}).keys() == {"visa"}
+    assert db.delete_ids(["visa"]) == 1
+    assert [doc.id for doc in db.search("visa", limit=3)] == ["deposit", "tuition"]
+
+
+def test_hybrid_search_finds_exact_codes_the_vectors_miss():
+    db = make_db(SearchType.hybrid)
+    results = db.search("221G", limit=1)
+    assert results[0].id == "visa"
+    assert "rrf_score" in results[0].meta_data
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from app.response_cache import ResponseCache
+from app.shared_state import InProcessBackend, SharedDict
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache("test", ttl=60, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_byte_cap_evicts_and_skips_oversized_values():
+    cache = ResponseCache("test", ttl=60, max_entries=100, max_bytes=10)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 8
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") is None
+    assert cache.get("b") == "yyyy"
+
+
+def test_entries_expire_and_are_swept():
+    cache = ResponseCache("test", ttl=0.05)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.sweep() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_copy_from_another_worker_expires_with_the_shared_entry():
+    shared = SharedDict("answers", ttl=0.05, backend=InProcessBackend())
+    writer = ResponseCache("test", ttl=60, shared=shared)
+    reader = ResponseCache("test", ttl=60, shared=shared)
+    writer.set("a", "1")
+    assert reader.get("a") == "1"
+    time.sleep(0.1)
+    assert reader.get("a") is None
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    cache = ResponseCache("test", ttl=60)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        results = await asyncio.gather(*(cache.single_flight("q", compute) for _ in range(5)))
+        assert results == ["answer"] * 5
+        assert calls == 1
+        assert cache.stats()["coalesced"] == 4
+        assert cache.stats()["in_flight"] == 0
+        # Once it finished, the next call computes again
+        await cache.single_flight("q", compute)
+        assert calls == 2
+
+    asyncio.run(main())
+
+
+def test_single_flight_shares_failures_and_survives_a_cancelled_caller():
+    cache = ResponseCache("test", ttl=60)
+
+    async def fails():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("model error")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        results = await asyncio.gather(
+            cache.single_flight("q", fails), cache.single_flight("q", fails), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        first = asyncio.ensure_future(cache.single_flight("r", slow))
+        second = asyncio.ensure_future(cache.single_flight("r", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+
+from app.agno_manager.bm25_index import tokenize
+from app.semantic_cache import SemanticCache
+
+VOCABULARY = ["deposit", "refund", "refunded", "deadline", "fall", "spring", "visa", "fee"]
+
+
+class WordEmbedder:
+    """Bag-of-words vectors, so similarity is predictable"""
+
+    dimensions = len(VOCABULARY)
+
+    def get_embedding(self, text):
+        words = tokenize(text)
+        vector = np.array([words.count(word) for word in VOCABULARY], dtype=np.float32)
+        # "refunded" is a close paraphrase of "refund"
+        vector[1] += 0.9 * vector[2]
+        vector[2] *= 0.3
+        return vector.tolist()
+
+
+def test_paraphrase_hits_and_unrelated_question_misses():
+    cache = SemanticCache(WordEmbedder(), threshold=0.9)
+    cache.set("Deposit refund?", "Refunds take two weeks.", "chat")
+    assert cache.get("Can my deposit be refunded?", "chat") == "Refunds take two weeks."
+    assert cache.get("Deposit refund?", "email") is None
+    assert cache.get("Spring deadline?", "chat") is None
+
+
+def test_near_duplicate_question_replaces_the_old_answer():
+    cache = SemanticCache(WordEmbedder(), threshold=0.9)
+    cache.set("Deposit refund?", "old", "chat")
+    cache.set("deposit refund", "new", "chat")
+    assert cache.stats()["entries"] == 1
+    assert cache.get("Deposit refund?", "chat") == "new"
+
+
+def test_entries_expire_and_least_recently_used_is_evicted():
+    cache = SemanticCache(WordEmbedder(), threshold=0.9, ttl=60, max_entries=2)
+    cache.set("fall deadline", "Fall", "chat")
+    cache.set("spring deadline", "Spring", "chat")
+    assert cache.get("fall deadline", "chat") == "Fall"
+    cache.set("visa fee", "Visa", "chat")
+    assert cache.get("spring deadline", "chat") is None
+    assert cache.get("fall deadline", "chat") == "Fall"
+
+    short_lived = SemanticCache(WordEmbedder(), threshold=0.9, ttl=0.05)
+    short_lived.set("visa fee", "Visa", "chat")
+    time.sleep(0.1)
+    assert short_lived.get("visa fee", "chat") is None
@@ -0,0 +1,32 @@
+import time
+
+from app.session_store import SessionStore
+
+
+def test_history_is_a_bounded_ring_buffer():
+    store = SessionStore(idle_ttl=60, history_size=3)
+    for turn in range(5):
+        store.append("s1", "user", f"message {turn}")
+    assert [message["content"] for message in store.history("s1")] == ["message 2", "message 3", "message 4"]
+    assert store.history("missing") is None
+
+
+def test_idle_sessions_expire_but_active_ones_stay():
+    store = SessionStore(idle_ttl=0.1)
+    store.append("idle", "user", "hello")
+    store.append("active", "user", "hello")
+    time.sleep(0.06)
+    store.append("active", "user", "still here")
+    time.sleep(0.06)
+    assert store.purge_expired() == 1
+    assert store.history("idle") is None
+    assert len(store.history("active")) == 2
+
+
+def test_least_recently_used_session_goes_at_the_cap():
+    store = SessionStore(idle_ttl=60, max_sessions=2)
+    store.append("a", "user", "1")
+    store.append("b", "user", "2")
+    store.append("c", "user", "3")
+    assert store.history("a") is None
+    assert store.stats()["sessions"] == 2
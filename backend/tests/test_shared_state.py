@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from app.shared_state import InProcessBackend, SQLiteBackend, StateBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    return InProcessBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "state.sqlite3"))
+
+
+def test_backend_must_implement_every_method():
+    class GetOnly(StateBackend):
+        def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_values_expire(backend):
+    backend.set("cache", "a", {"answer": 1}, ttl=0.05)
+    backend.set("cache", "b", "kept")
+    assert backend.get("cache", "a") == {"answer": 1}
+    time.sleep(0.1)
+    assert backend.get("cache", "a") is None
+    assert backend.pop("cache", "b") == "kept"
+    assert backend.get("cache", "b") is None
+
+
+def test_append_keeps_the_newest_items(backend):
+    for item in range(5):
+        backend.append("log", "events", item, max_items=3)
+    assert backend.get("log", "events") == [2, 3, 4]
+
+
+def test_update_is_atomic(backend):
+    def increment():
+        for _ in range(50):
+            backend.update("counters", "hits", lambda value: (value or 0) + 1)
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get("counters", "hits") == 200
+
+
+def test_sqlite_state_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    first.set("tasks", "t1", {"status": "running"})
+    second.update("tasks", "t1", lambda task: {**task, "status": "completed"})
+    assert first.get("tasks", "t1") == {"status": "completed"}
@@ -0,0 +1,92 @@
+from pathlib import Path
+import asyncio
+
+import pytest
+
+async_api = pytest.importorskip("playwright.async_api")
+
+import app.slate_dom as slate_dom
+from app.slate_dom import SlateLayoutError, fill_reply, list_inbox_emails, read_message
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture_url(name: str) -> str:
+    return (FIXTURES / name).as_uri()
+
+
+def with_page(test):
+    """Run test(page) in a headless Chromium page, or skip when Chromium is not installed"""
+    async def main():
+        async with async_api.async_playwright() as playwright:
+            try:
+                browser = await playwright.chromium.launch(headless=True)
+            except Exception as e:
+                pytest.skip(f"headless Chromium is not available: {e}")
+            try:
+                return await test(await browser.new_page())
+            finally:
+                await browser.close()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(slate_dom, "SLATE_DOM_TIMEOUT", 1000)
+
+
+def test_list_inbox_emails():
+    async def test(page):
+        urls = await list_inbox_emails(page, fixture_url("slate_inbox.html"), limit=5)
+        assert [url.rsplit("/", 1)[-1] for url in urls] == ["1?id=3f1c", "2?id=8a2d", "3?id=c41e"]
+        assert all(url.startswith("file://") for url in urls)
+        assert len(await list_inbox_emails(page, fixture_url("slate_inbox.html"), limit=2)) == 2
+
+    with_page(test)
+
+
+def test_read_message():
+    async def test(page):
+        text = await read_message(page, fixture_url("slate_message_ckeditor.html"))
+        assert text.startswith("Hi,")
+        assert "early decision deadline" in text
+        assert "Internal notes" not in text
+        with pytest.raises(SlateLayoutError):
+            await read_message(page, fixture_url("slate_inbox.html"))
+
+    with_page(test)
+
+
+def test_fill_reply_in_ckeditor_frame():
+    async def test(page):
+        await page.goto(fixture_url("slate_message_ckeditor.html"))
+        await fill_reply(page, "Hi Sam,\nThe deadline is November 1.")
+        editor = page.frame_locator("iframe.cke_wysiwyg_frame").locator("body.cke_editable")
+        assert await editor.inner_text() == "Hi Sam,\nThe deadline is November 1."
+        # Editable areas outside the reply form are left alone
+        assert await page.inner_text("#notes") == "Internal notes"
+        assert await page.input_value("textarea[name='q']") == ""
+
+    with_page(test)
+
+
+def test_fill_reply_in_textarea():
+    async def test(page):
+        await page.goto(fixture_url("slate_message_textarea.html"))
+        await fill_reply(page, "Yes, a PDF is fine.")
+        assert await page.input_value("#reply textarea[name='body']") == "Yes, a PDF is fine."
+        assert await page.inner_text("#notes") == "Internal notes"
+        assert await page.input_value("textarea[name='q']") == ""
+
+    with_page(test)
+
+
+def test_fill_reply_without_reply_button_does_not_touch_the_page():
+    async def test(page):
+        await page.goto(fixture_url("slate_inbox.html"))
+        with pytest.raises(SlateLayoutError):
+            await fill_reply(page, "draft")
+        assert await page.input_value("textarea[name='q']") == ""
+
+    with_page(test)
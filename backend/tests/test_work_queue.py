@@ -0,0 +1,40 @@
+import asyncio
+
+from app.work_queue import run_work_queue
+
+
+def test_failures_are_retried_without_stopping_other_keys():
+    attempts = {}
+    active = 0
+    peak = 0
+    updates = []
+
+    async def handle(key):
+        nonlocal active, peak
+        attempts[key] = attempts.get(key, 0) + 1
+        active += 1
+        peak = max(peak, active)
+        try:
+            await asyncio.sleep(0.01)
+            if key == "flaky" and attempts[key] == 1:
+                raise RuntimeError("paste failed")
+            if key == "broken":
+                raise RuntimeError("no reply editor")
+            if key == "slow":
+                raise asyncio.TimeoutError()
+        finally:
+            active -= 1
+
+    async def on_update(items):
+        updates.append([item.status for item in items])
+
+    items = asyncio.run(run_work_queue(
+        ["ok", "flaky", "broken", "slow", "ok2"], handle, workers=2, retries=1, on_update=on_update
+    ))
+    assert {item.key: item.status for item in items} == {
+        "ok": "completed", "flaky": "completed", "broken": "failed", "slow": "timeout", "ok2": "completed",
+    }
+    assert {item.key: item.attempts for item in items} == {"ok": 1, "flaky": 2, "broken": 2, "slow": 2, "ok2": 1}
+    assert items[2].error == "no reply editor"
+    assert peak == 2
+    assert updates[-1] == [item.status for item in items]
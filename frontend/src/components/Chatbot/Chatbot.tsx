@@ -1,6 +1,7 @@
 import React, { useState, useRef, useEffect, useCallback } from 'react';
 import { useAuth } from '../../context/AuthContext';
 import axios from 'axios';
+import { chatService } from '../../services/ChatService';
 import './Chatbot.css';
 
 interface Message {
@@ -54,6 +55,7 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialPrompt, onStartConversation })
   const [suggestedQuestions, setSuggestedQuestions] = useState<SuggestedQuestion[]>([]);
   const [initialPromptProcessed, setInitialPromptProcessed] = useState(false);
   const [processingPrompt, setProcessingPrompt] = useState(false);
+  const [streamingMessageId, setStreamingMessageId] = useState<string | null>(null);
 
   useEffect(() => {
     if (textareaRef.current) {
@@ -134,36 +136,40 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialPrompt, onStartConversation })
     setSuggestedQuestions([]);
     
     try {
-      const messageHistory = messages
-        .filter(msg => msg.id !== 'welcome')
-        .map(msg => ({
-          role: msg.sender === 'user' ? 'user' : 'assistant',
-          content: msg.content
-        }));
+      const aiMessageId = `ai-${Date.now()}`;
+      let streamStarted = false;
       
-      const response = await axios.post('http://localhost:8000/api/chat', {
-        message: userMessage.content,
-        user_id: user?.id || 'anonymous',
-        conversation_history: messageHistory,
-        session_id: conversationId
-      }, { timeout: 30000 });
+      const response = await chatService.streamMessage(
+        userMessage.content,
+        user?.id || 'anonymous',
+        messages,
+        conversationId || undefined,
+        (token) => {
+          if (!streamStarted) {
+            // First token: replace the typing indicator with the answer being written
+            streamStarted = true;
+            setStreamingMessageId(aiMessageId);
+            setMessages(prev => [...prev, {
+              id: aiMessageId,
+              content: token,
+              sender: 'ai',
+              timestamp: new Date(),
+            }]);
+          } else {
+            setMessages(prev => prev.map(msg =>
+              msg.id === aiMessageId ? { ...msg, content: msg.content + token } : msg
+            ));
+          }
+        }
+      );
       
-      if (response.data.conversation_id) {
-        setConversationId(response.data.conversation_id);
+      if (response.conversation_id) {
+        setConversationId(response.conversation_id);
       }
       
-      const aiMessage: Message = {
-        id: `ai-${Date.now()}`,
-        content: response.data.response,
-        sender: 'ai',
-        timestamp: new Date(),
-      };
-      
-      setMessages(prev => [...prev, aiMessage]);
-      
-      if (response.data.suggested_questions?.length > 0) {
+      if (response.suggested_questions && response.suggested_questions.length > 0) {
         setSuggestedQuestions(
-          response.data.suggested_questions.map((q: string, i: number) => ({
+          response.suggested_questions.map((q: string, i: number) => ({
             id: `suggestion-${Date.now()}-${i}`,
             text: q
           }))
@@ -180,6 +186,7 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialPrompt, onStartConversation })
       setMessages(prev => [...prev, errorMessage]);
     } finally {
       setIsProcessing(false);
+      setStreamingMessageId(null);
     }
   }, [inputValue, isProcessing, messages, conversationId, user?.id]);
 
@@ -290,7 +297,7 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialPrompt, onStartConversation })
             </div>
           ))}
           
-          {isProcessing && (
+          {isProcessing && !streamingMessageId && (
             <div className="flex justify-start">
               <div className="max-w-[85%] md:max-w-[75%] rounded-2xl p-4 bg-white shadow-card border border-neutral-200">
                 <div className="flex items-center mb-2">
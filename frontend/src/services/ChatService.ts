@@ -33,6 +33,13 @@ interface ChatResponse {
   suggested_questions?: string[];
 }
 
+// Payload of the final `done` event of a streamed chat response
+interface ChatStreamDone {
+  conversation_id?: string;
+  processing_time?: number;
+  suggested_questions?: string[];
+}
+
 /**
  * Service to handle chat-related API calls and local storage
  */
@@ -105,6 +112,85 @@ class ChatService {
     }
   }
   
+  /**
+   * Send a message and receive the answer as Server-Sent Events
+   * @param message The message text
+   * @param userId The user's ID
+   * @param conversationHistory Previous messages
+   * @param sessionId Optional session ID for continuity
+   * @param onToken Called with each chunk of text as it arrives
+   * @returns The complete response once the stream has finished
+   */
+  async streamMessage(
+    message: string,
+    userId: string,
+    conversationHistory: Message[] = [],
+    sessionId?: string,
+    onToken: (token: string) => void = () => {}
+  ): Promise<ChatResponse> {
+    const apiHistory = conversationHistory
+      .filter(msg => msg.id !== 'welcome') // Skip welcome message
+      .map(msg => ({
+        role: msg.sender === 'user' ? 'user' : 'assistant',
+        content: msg.content
+      }));
+
+    const requestData: ChatRequest = {
+      message,
+      user_id: userId,
+      conversation_history: apiHistory.length > 0 ? apiHistory : undefined,
+      session_id: sessionId
+    };
+
+    // EventSource only supports GET, so read the POST response body as a stream
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify(requestData)
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+    let done: ChatStreamDone = {};
+
+    while (true) {
+      const { value, done: finished } = await reader.read();
+      if (finished) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line; keep any partial event for the next read
+      const events = buffer.split('\n\n');
+      buffer = events.pop() || '';
+
+      for (const rawEvent of events) {
+        let eventName = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) eventName = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (eventName === 'token') {
+          content += payload.content;
+          onToken(payload.content);
+        } else if (eventName === 'done') {
+          done = payload;
+        } else if (eventName === 'error') {
+          throw new Error(payload.detail);
+        }
+      }
+    }
+
+    return { response: content, ...done };
+  }
+  
   /**
    * Retrieve conversation history from local storage
    * @returns The stored conversation or null if not found